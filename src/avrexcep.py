@@ -19,3 +19,18 @@ class BreakException(AVRException):
 class UnknownCodeError(AVRException):
     """ Raises when given instruction is unknown """
     pass
+
+
+class HexFormatError(AVRException):
+    """ Raised when a .hex file is not valid Intel HEX """
+    pass
+
+
+class ReplayError(AVRException):
+    """ Raised when a replayed input does not match the run """
+    pass
+
+
+class AnalysisError(AVRException):
+    """ Raised when a program can not be analyzed statically """
+    pass
@@ -1,12 +1,117 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
 import sys
+import time
+from array import array
 
-from avrexcep import OutOfMemError, UnknownCodeError, BreakException
+import hexfile
+from avrexcep import AVRException, OutOfMemError, UnknownCodeError
+from avrexcep import BreakException
 from state import State
 from instruction import Add, Adc, Sub, Subi, And, Or, Eor, Lsr, Mov, Ldi, Sts, Lds, Rjmp, Brbs, Brbc, Nop, Break, In, Out
 from repertoir import Repertoir
+from compiler import BlockCompiler
+from fusion import Fuser
+from idle import IdleDetector, WAIT
+from cfg import CfgBuilder
+
+# Reasons of the end of a simulation
+BREAK = "break" # BREAK instruction executed
+BUDGET = "budget" # Maximum number of instructions executed
+UNKNOWN_CODE = "unknown code" # Instruction without InstRunner
+OUT_OF_MEM = "out of memory" # Access to an inexistent address
+BREAKPOINT = "breakpoint" # PC reached the address to stop
+WATCHPOINT = "watchpoint" # Access to a watched address of data memory
+IDLE = "idle" # Loop that nothing can leave, without maximum of instructions
+
+
+CLOCK = 16000000 # Clock of the simulated MCU, in Hz
+
+
+class RunResult(object):
+    """
+    Represents the end of a call to AvrMcu.run.
+
+    :ivar reason: Reason of the stop, BREAK, BUDGET, UNKNOWN_CODE,
+        OUT_OF_MEM, BREAKPOINT, WATCHPOINT or IDLE
+    :vartype reason: str
+    :ivar steps: Instructions executed
+    :vartype steps: int
+    :ivar message: Description of the error, or None
+    :vartype message: str
+    :ivar cycles: Cycles executed
+    :vartype cycles: int
+    :ivar seconds: Wall-clock time of the run
+    :vartype seconds: float
+    """
+    __slots__ = ('reason', 'steps', 'message', 'cycles', 'seconds')
+
+    def __init__(self, reason, steps, message=None, cycles=0, seconds=0.0):
+        self.reason = reason
+        self.steps = steps
+        self.message = message
+        self.cycles = cycles
+        self.seconds = seconds
+
+    def __repr__(self):
+        return "{0} after {1} instructions".format(self.reason, self.steps)
+
+    def mhz(self):
+        """
+        Returns the speed of the simulator in simulated MHz, that are
+        millions of cycles per wall-clock second.
+
+        :return: Simulated MHz
+        :rtype: float
+        """
+        if self.seconds <= 0:
+            return 0.0
+        return self.cycles / self.seconds / 1e6
+
+    def report(self, clock=CLOCK):
+        """
+        Represents the throughput of the run like this:
+
+        1000 instructions, 1200 cycles in 0.0100 s: 0.120 MHz
+        (0.75% of real time at 16 MHz)
+
+        :param clock: Clock of the real MCU, in Hz
+        :type clock: int
+
+        :return: Representation
+        :rtype: str
+        """
+        mhz = self.mhz()
+        return ("{0} instructions, {1} cycles in {2:.4f} s: {3:.3f} MHz "
+                "({4:.2%} of real time at {5:g} MHz)").format(self.steps,
+                self.cycles, self.seconds, mhz, mhz * 1e6 / clock, clock / 1e6)
+
+
+def stop(e, nsteps):
+    """
+    Converts the exception that stopped a loop of AvrMcu.run into the
+    reason of the stop. A BREAK counts as executed. The other
+    exceptions, as ReplayError, are raised again with the traceback of
+    where they were raised, so it must be called while handling e.
+
+    :param e: Exception raised
+    :type e: instance of AVRException
+    :param nsteps: Instructions executed before the exception
+    :type nsteps: int
+
+    :return: Reason of the stop, instructions executed and message
+    :rtype: tuple
+    """
+    if isinstance(e, BreakException):
+        return BREAK, nsteps + 1, None
+    if isinstance(e, OutOfMemError):
+        return OUT_OF_MEM, nsteps, str(e)
+    if isinstance(e, UnknownCodeError):
+        return UNKNOWN_CODE, nsteps, None
+    raise type(e), e, sys.exc_info()[2]
+
 
 class AvrMcu(object):
     """
@@ -16,9 +121,29 @@ class AvrMcu(object):
     :type _rep: Instance of State
     :param _rep: Repertoir of instructions of the simulator
     :type _rep: Instance of Repertoir
+    :param blocks: Run the basic blocks compiled into Python functions
+    :type blocks: bool
+    :param fusion: Run the fused sequences of instructions when the
+        blocks are not used
+    :type fusion: bool
+    :param idle: Fast-forward the idle loops
+    :type idle: bool
+    :ivar breakpoints: Breakpoints and watchpoints of the simulation,
+        or None
+    :vartype breakpoints: object from breakpoints.Breakpoints
+    :ivar fusion_stats: Statistics of the fused sequences run, or None
+    :vartype fusion_stats: object from fusion.FusionStats
     """
-    def __init__(self):
+    def __init__(self, blocks=True, fusion=True, idle=True):
         self._s = State()
+        self.blocks = blocks
+        self.fusion = fusion
+        self.idle = idle
+        self.breakpoints = None
+        self.fusion_stats = None
+        self._compiler = BlockCompiler(self.decode)
+        self._fuser = Fuser(self.decode)
+        self._idle_detector = IdleDetector(self.decode)
 
         # Instance declaration of all instructions
         add = Add()
@@ -51,11 +176,15 @@ class AvrMcu(object):
 
         self.reset()
 
-    def reset(self):
+    def reset(self, keep_program=True):
         """
-        Reset the state.
+        Reset the state in place. The program installed is kept,
+        unless keep_program is False.
+
+        :param keep_program: Keep the program installed
+        :type keep_program: bool
         """
-        self._s = State()
+        self._s.reset(keep_program)
     
     def set_prog(self, p):
         """
@@ -64,8 +193,28 @@ class AvrMcu(object):
         :param p: Program to install
         :type p: str of int
         """
-        for x in range(len(p)):
-            self._s.prog[x] = p[x]
+        self._s.prog.load(array('H', [int(x) & 0xFFFF for x in p]))
+
+    def load_hex(self, path):
+        """
+        Installs a program from an Intel HEX file on the memory. The
+        cells out of the image are cleared. If there is a matching
+        .eep.hex file, its content is loaded on EEPROM; if not, EEPROM
+        is left empty.
+
+        :param path: Path to the .hex file
+        :type path: str
+        """
+        start, words = hexfile.load_hex(path)
+        eep_path = hexfile.eep_path(path)
+        if eep_path != path and os.path.exists(eep_path):
+            eeprom = hexfile.load_eep(eep_path)
+        else:
+            eeprom = bytearray()
+
+        self._s.prog.clear()
+        self._s.prog.load(words, start)
+        self._s.eeprom = eeprom
 
     def dump_reg(self):
         """
@@ -94,51 +243,320 @@ class AvrMcu(object):
         """
         return self._s.dump_prog()
 
-    def run(self):
+    def decode(self, addr):
+        """
+        Decodes the instruction of an address of program memory and
+        stores it in the cache of decoded instructions.
+
+        :param addr: Address of program memory
+        :type addr: int
+
+        :return: Decoded instruction
+        :rtype: object from Decoded
+        """
+        instruction = self._s.prog[addr]
+
+        # Decode InstRunner and operands
+        dec = self._rep.decode(instruction).decode(instruction)
+        self._s.prog.set_decoded(addr, dec)
+
+        return dec
+
+    def analyze(self, entry=0):
+        """
+        Builds the control-flow graph of the program installed, without
+        running it. The reachable instructions are left decoded in the
+        cache of program memory.
+
+        :param entry: Address where the execution starts
+        :type entry: int
+
+        :return: Control-flow graph, with the reachable blocks and the
+            errors and infinite loops that they can reach
+        :rtype: object from cfg.Cfg
+        """
+        return CfgBuilder(self.decode).build(self._s, entry)
+
+    def run(self, max_steps=None, until_pc=None, profiler=None):
         """
         Is the principal method of the simulator. When it's called it
-        starts an infinite loop:
+        starts a loop:
 
         (1) Obtain the instruction indicicated by PC
-        (2) Find an InstRunner that can run the instruction
+        (2) Decode the InstRunner that can run the instruction and
+            its operands, unless it is in the cache of program memory
         (3) Executes the instruction
 
-        Also has a catcher for diferent type of exceotions, such as
-        OutOfMemError, UnknownCodeError and BreakException.
+        The loop ends on a BREAK, an OutOfMemError, an
+        UnknownCodeError, after max_steps instructions or when PC
+        reaches until_pc, and returns why. The state is kept, so
+        calling run again resumes the execution. The instruction at
+        PC is always executed, even if PC is until_pc, so a stop at
+        until_pc can be resumed with the same until_pc. After a BREAK,
+        PC stays on it.
+
+        If blocks is set, the basic blocks are compiled and each one is
+        run with a single call, unless it would pass max_steps or
+        until_pc. If not, and fusion is set, the fused sequences of
+        instructions are run the same way, and counted on fusion_stats
+        if it is set.
+
+        If idle is set, the loops where the program waits without
+        changing the state, as a RJMP to itself or a loop that polls a
+        port that is not ready, are fast-forwarded when they are
+        entered: up to max_steps, counting the instructions and cycles
+        of the iterations skipped, or, without it, the run blocks until
+        a port that the loop reads is ready, and the time waited counts
+        no cycles. A loop that reads no port, or only ports whose
+        handlers can not become ready, can not be left, so without
+        max_steps the run stops with IDLE.
+
+        With a profiler, with breakpoints or watchpoints set,
+        or with the trace of data memory on, the instructions are run
+        one by one by an instrumented loop instead, so the normal loop
+        does not pay for them. They can be combined: a profiled run
+        stops on the breakpoints and the watchpoints, and keeps the
+        trace, as a run without profiler does.
+
+        :param max_steps: Maximum instructions to execute, no limit
+            if None
+        :type max_steps: int
+        :param until_pc: Address where the execution stops
+        :type until_pc: int
+        :param profiler: Profiler that collects statistics of the run,
+            none if None
+        :type profiler: object from profiler.Profiler
+
+        :return: Reason of the stop and instructions executed
+        :rtype: object from RunResult
         """
+        state = self._s
+        limit = -1 if max_steps is None else max_steps
+        cycles = state.cycles
+        start = time.time()
+        breakpoints = self.breakpoints if self.breakpoints else None
+        recorder = state.data._recorder if state.data._trace else None
+        if profiler is not None or breakpoints is not None or \
+                recorder is not None:
+            reason, nsteps, message = self._loop_steps(limit, until_pc,
+                                                       breakpoints, recorder,
+                                                       profiler)
+        else:
+            reason, nsteps, message = self._loop(limit, until_pc)
+        return RunResult(reason, nsteps, message, state.cycles - cycles,
+                         time.time() - start)
+
+    def _loop(self, limit, until_pc):
+        """
+        Executes instructions until a stop, without any instrumentation.
+        It is the loop of run without profiler, breakpoints or trace.
+        If blocks is set, runs the compiled basic blocks, and if not and
+        fusion is set, the fused sequences, when they fit in the limit
+        and do not contain until_pc after their first address. Both
+        are found the same way, only the cache and the function that
+        builds them differ.
+
+        :param limit: Maximum instructions to execute, -1 for no limit
+        :type limit: int
+        :param until_pc: Address where the execution stops
+        :type until_pc: int
+
+        :return: Reason of the stop, instructions executed and message
+        :rtype: tuple
+        """
+        state = self._s
+        prog = state.prog
+        decoded = prog._decoded # Cache of decoded instructions
+        stats = None
+        if self.blocks: # Cache of compiled blocks
+            seqs, build, store = prog._blocks, self._compiler.compile, \
+                                 prog.set_block
+        elif self.fusion: # Cache of fused sequences
+            seqs, build, store = prog._fused, self._fuser.fuse, \
+                                 prog.set_fused
+            stats = self.fusion_stats
+        else:
+            seqs = None
+        until = -1 if until_pc is None else until_pc
+        nsteps = 0
+        last = -1 # Last PC, to find the backward jumps
         try:
             while True:
-                # Get next instruction
-                instruction = self._s.prog[self._s.pc]
+                pc = int(state.pc)
+                if pc == until_pc and nsteps:
+                    return BREAKPOINT, nsteps, None
+                if nsteps == limit:
+                    return BUDGET, nsteps, None
+
+                # A backward jump can enter an idle loop
+                if pc <= last and self.idle:
+                    skipped = self._skip_idle(pc, nsteps, limit, until_pc)
+                    if skipped < 0:
+                        return IDLE, nsteps, None
+                    if skipped:
+                        nsteps = nsteps + skipped
+                        continue
+                last = pc
 
-                # Find InstRunner
-                instrunner = self._rep.find(instruction)
+                # Run the block or the sequence that starts at PC, building
+                # it if needed
+                if seqs is not None and 0 <= pc < len(seqs):
+                    seq = seqs[pc]
+                    if seq is None:
+                        seq = build(state, pc)
+                        store(pc, seq)
+                    steps = seq.steps
+                    if (steps and (limit < 0 or nsteps + steps <= limit) and
+                            not pc < until < pc + steps):
+                        seq.run(state)
+                        nsteps = nsteps + steps
+                        if stats is not None:
+                            stats.count(seq)
+                        continue
+
+                # Get next instruction, already decoded if possible
+                dec = decoded[pc] if 0 <= pc < len(decoded) else None
+                if dec is None:
+                    dec = self.decode(pc)
 
                 # Execute Instruction
-                instrunner.execute(instruction, self._s)
-        
-        except OutOfMemError:
-            print "Out of Memory"
-            sys.exit()
-            
-        except UnknownCodeError:
-            print "Unknown Code Error"
-            sys.exit()
-        
-        except BreakException:
-            sys.exit()
+                dec.runner.execute_decoded(dec, state)
+                nsteps = nsteps + 1
+
+        except AVRException as e:
+            return stop(e, nsteps)
+
+    def _loop_steps(self, limit, until_pc, breakpoints=None, recorder=None,
+                    profiler=None):
+        """
+        Executes instructions one by one until a stop, with the
+        instrumentation given. It is the loop of run with a profiler,
+        breakpoints or the trace of data memory, so _loop does not pay
+        for them. Blocks, fused sequences and idle loops are not used.
+
+        :param limit: Maximum instructions to execute, -1 for no limit
+        :type limit: int
+        :param until_pc: Address where the execution stops
+        :type until_pc: int
+        :param breakpoints: Breakpoints and watchpoints where the
+            execution stops, none if None
+        :type breakpoints: object from breakpoints.Breakpoints
+        :param recorder: Recorder of the trace of data memory, that
+            keeps the step and the PC of its records, none if None
+        :type recorder: object from memtrace.TraceRecorder
+        :param profiler: Profiler that executes and counts the
+            instructions, none if None
+        :type profiler: object from profiler.Profiler
+
+        :return: Reason of the stop, instructions executed and message
+        :rtype: tuple
+        """
+        state = self._s
+        decoded = state.prog._decoded # Cache of decoded instructions
+        pcs = None # Addresses with a breakpoint
+        if breakpoints is not None:
+            pcs = breakpoints.arm(state.data)
+        nsteps = 0
+        try:
+            while True:
+                pc = int(state.pc)
+                if pc == until_pc and nsteps:
+                    return BREAKPOINT, nsteps, None
+                if pcs is not None and pcs[pc] and nsteps and \
+                        breakpoints.holds(pc, state):
+                    return BREAKPOINT, nsteps, breakpoints.describe()
+                if nsteps == limit:
+                    return BUDGET, nsteps, None
+
+                # Get next instruction, already decoded if possible
+                dec = decoded[pc] if 0 <= pc < len(decoded) else None
+                if dec is None:
+                    dec = self.decode(pc)
 
+                # Execute Instruction
+                if recorder is not None:
+                    recorder.pc = pc
+                if profiler is not None:
+                    profiler.execute(pc, dec, state)
+                else:
+                    dec.runner.execute_decoded(dec, state)
+                nsteps = nsteps + 1
+                if recorder is not None:
+                    recorder.step = recorder.step + 1
+                if pcs is not None and breakpoints.hit is not None:
+                    return WATCHPOINT, nsteps, breakpoints.describe()
+
+        except AVRException as e:
+            return stop(e, nsteps)
+
+        finally:
+            if breakpoints is not None:
+                breakpoints.disarm(state.data)
+
+    def _skip_idle(self, pc, nsteps, limit, until_pc):
+        """
+        Fast-forwards the idle loop that starts at PC, if any. With a
+        limit, the whole iterations that fit in it are skipped at once,
+        and add their cycles to the state. Without, the run blocks until
+        a port that the loop reads is ready, if any can become ready,
+        and no iteration is skipped: the input counts as arrived at the
+        cycle the loop was entered, so the cycles of the run do not
+        depend on the time waited, and the run can be replayed and
+        cached. The loops that contain until_pc are not skipped.
+
+        :param pc: Address where the loop would start
+        :type pc: int
+        :param nsteps: Instructions executed
+        :type nsteps: int
+        :param limit: Maximum instructions to execute, -1 for no limit
+        :type limit: int
+        :param until_pc: Address where the execution stops
+        :type until_pc: int
+
+        :return: Instructions skipped, or -1 if nothing can leave the
+            loop and there is no limit
+        :rtype: int
+        """
+        state = self._s
+        idle = state.prog._idle
+        if not 0 <= pc < len(idle):
+            return 0
+        reach = idle[pc]
+        if reach is None:
+            reach = self._idle_detector.reach(state, pc)
+            idle[pc] = reach
+        if not reach[0]:
+            return 0
+
+        loop = self._idle_detector.find(state, pc)
+        if loop is None or until_pc in loop.addrs:
+            return 0
+        ports = state.ports
+        if ports.ready(loop.ports):
+            return 0
+        if limit >= 0:
+            iterations = (limit - nsteps) // loop.steps
+        elif ports.can_become_ready(loop.ports):
+            while not ports.wait(loop.ports, WAIT):
+                pass
+            return 0
+        else:
+            return -1
+        state.cycles = state.cycles + iterations * loop.cycles
+        return iterations * loop.steps
 
-    def set_trace(self, t):
+    def set_trace(self, t, recorder=None):
         """
         If t=True activates mode trace of data memory, else if t=False,
         deacrivate the mode.
 
         :param t: Active or deactive
         :type t: boolean
+        :param recorder: Recorder of the trace, a new one if None
+        :type recorder: object from memtrace.TraceRecorder
         """           
         if t:
-            return self._s.data.trace_on()
+            return self._s.data.trace_on(recorder)
         else:
             return self._s.data.trace_off()
         
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import argparse
+import multiprocessing
+
+from avrmcu import AvrMcu
+from cache import ResultCache
+from state import C, Z, N
+from ports import OutputBuffer, CONSOLE_PORTS
+
+_avrmcu = None # Simulator of the process, reused between programs
+
+REJECTED = "rejected" # Program that can reach no BREAK, not simulated
+
+def find_programs(path):
+    """
+    Finds the programs of a directory, that are the .hex files that
+    are not EEPROM images (.eep.hex).
+
+    :param path: Directory
+    :type path: str
+
+    :return: Paths of the programs, sorted
+    :rtype: list of str
+    """
+    programs = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".hex") and not name.endswith(".eep.hex"):
+            programs.append(os.path.join(path, name))
+    return programs
+
+
+def run_program(path, max_steps, check=False, cache=None):
+    """
+    Simulates a program from reset until a BREAK, an error or
+    max_steps instructions. The output of the program is captured
+    instead of printed, and IN leaves the registers as they are.
+
+    If check is set, the program is analyzed first, and it is not
+    simulated when no BREAK can be reached from reset: the reason is
+    REJECTED and the error is the report of the analysis.
+
+    If cache is given, the result of the same program with the same
+    max_steps is taken from the cache in that directory when it is
+    there, instead of simulating it. The processes of a batch can
+    share the directory.
+
+    :param path: Path to the .hex file
+    :type path: str
+    :param max_steps: Maximum instructions to execute
+    :type max_steps: int
+    :param check: Reject the programs that can not end on a BREAK
+    :type check: bool
+    :param cache: Directory of the cache of results, none if None
+    :type cache: str
+
+    :return: Result of the simulation, with keys path, reason, steps,
+        cycles, seconds, pc, flags, registers, output and error
+    :rtype: dict
+    """
+    global _avrmcu
+    if _avrmcu is None:
+        _avrmcu = AvrMcu()
+    avrmcu = _avrmcu
+    avrmcu.reset(keep_program=False)
+
+    result = {"path": path, "reason": None, "steps": 0, "cycles": 0,
+              "seconds": 0.0, "pc": 0, "flags": None, "registers": None,
+              "output": "", "error": None}
+
+    # Headless: the writes are kept and the reads find no input
+    output = OutputBuffer()
+    avrmcu._s.ports.bind(CONSOLE_PORTS, output)
+    try:
+        avrmcu.load_hex(path)
+        cfg = avrmcu.analyze() if check else None
+        if cfg is not None and not cfg.can_break():
+            result["reason"], result["error"] = REJECTED, cfg.report()
+        else:
+            if cache is None:
+                run = avrmcu.run(max_steps)
+            else:
+                run = ResultCache(cache, shared=True).run(avrmcu, max_steps,
+                                                          output=output)
+            result["reason"], result["steps"] = run.reason, run.steps
+            result["cycles"], result["seconds"] = run.cycles, run.seconds
+            result["error"] = run.message
+    except Exception as e:
+        result["reason"] = "error"
+        result["error"] = "{0}: {1}".format(type(e).__name__, e)
+
+    state = avrmcu._s
+    result["pc"] = int(state.pc)
+    result["flags"] = {"C": int(state.flags[C]), "Z": int(state.flags[Z]),
+                       "N": int(state.flags[N])}
+    result["registers"] = list(state.data.get_raw()[:32])
+    result["output"] = output.getvalue()
+
+    return result
+
+
+def _run_program(args):
+    """
+    Calls run_program with a tuple of arguments, for Pool.imap.
+    """
+    return run_program(*args)
+
+
+def run_batch(paths, max_steps=100000, processes=None, check=False,
+              cache=None):
+    """
+    Simulates many programs sharded across a pool of processes. Each
+    process reuses its simulator between programs.
+
+    :param paths: Paths to the .hex files
+    :type paths: list of str
+    :param max_steps: Maximum instructions of each program
+    :type max_steps: int
+    :param processes: Number of processes, the number of CPUs if None,
+        in this process if 1
+    :type processes: int
+    :param check: Reject the programs that can not end on a BREAK
+    :type check: bool
+    :param cache: Directory of the cache of results, none if None
+    :type cache: str
+
+    :return: Results of run_program, in the same order than paths
+    :rtype: list of dict
+    """
+    tasks = [(x, max_steps, check, cache) for x in paths]
+
+    if processes == 1:
+        return [_run_program(x) for x in tasks]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        nproc = processes or multiprocessing.cpu_count()
+        chunksize = max(1, len(tasks) // (nproc * 4))
+        return pool.map(_run_program, tasks, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='AVR batch simulator')
+    parser.add_argument('path',
+                        metavar='path',
+                        type=str,
+                        help='Directory with hex files')
+    parser.add_argument('-n',
+                        type=int,
+                        default=100000,
+                        help='Maximum instructions of each program')
+    parser.add_argument('-j',
+                        type=int,
+                        default=None,
+                        help='Number of processes')
+    parser.add_argument('-o',
+                        type=str,
+                        default=None,
+                        help='Write the results to a JSON file')
+    parser.add_argument('--check',
+                        action='store_true',
+                        help='Reject the programs that can reach no BREAK')
+    parser.add_argument('--cache',
+                        type=str,
+                        default=None,
+                        help='Directory of the cache of results')
+    args = parser.parse_args()
+
+    results = run_batch(find_programs(args.path), args.n, args.j, args.check,
+                        args.cache)
+
+    if args.o:
+        with open(args.o, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+    for x in results:
+        print "{0}: {1} after {2} instructions, {3} cycles, PC: {4}".format(
+              x["path"], x["reason"], x["steps"], x["cycles"], x["pc"])
+
+    cycles = sum(x["cycles"] for x in results)
+    seconds = sum(x["seconds"] for x in results)
+    if seconds > 0:
+        print "{0} cycles in {1:.4f} s: {2:.3f} simulated MHz".format(cycles,
+              seconds, cycles / seconds / 1e6)
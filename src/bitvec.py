@@ -6,9 +6,18 @@ class BitVector(object):
     Represents a binary word of a certain size, but less or equal to
     16 bits unsigned.
 
+    Every operation works with integer bit operations over _w. The
+    logical operations and the shifts keep the result in the width of
+    the vector, 8 bits for a Byte and 16 bits for a Word.
+
     :param _w: Codec the value of BitVector
     :type _w: int, private
     """
+    __slots__ = ('_w',)
+
+    _nbits = 16 # Width of the vector
+    _ones = 0xFFFF # Mask with all the bits of the vector
+
     def __init__(self, w=0):
         self._w = w
     
@@ -28,18 +37,9 @@ class BitVector(object):
         :return: Postive integrer
         :rtype: int
         """
-        # Generate binary from self._w
-        self_bin = bin(self._w).replace("0b", "").zfill(self.__len__())
-
-        mask = mask.zfill(self.__len__())
-        
-        # Apply the mask
-        result_bin = ""
-        for x in range(self.__len__()):
-            result_bin = result_bin + str(int(self_bin[x]) & int(mask[x]))
-        result_bin = "0b" + result_bin.zfill(self.__len__())
+        result = self._w & int(mask or "0", 2) & self._ones
 
-        return result_bin
+        return "0b" + format(result, "0{0}b".format(self._nbits))
 
 
     def extract_field_s(self, mask):
@@ -59,8 +59,7 @@ class BitVector(object):
         return self._w
 
     def __index__(self):
-        self_bin = bin(self._w).replace("0b", "")
-        return int(self_bin, 2)
+        return self._w
         
     def __repr__(self):
         my_hex = hex(self._w)[2:].upper() # Generate Hex number
@@ -69,132 +68,80 @@ class BitVector(object):
         return my_hex
 
     def __add__(self, o):
-        if type(o) is int: # o is an int
-            add = int(self._w) + o
-            return self.__class__(add)
-        elif isinstance(o, object):# o is an object
-            add = int(self._w) + int(o._w)
-            return self.__class__(add)
+        return self.__class__(self._w + int(o))
 
     def __sub__(self, o):
-        if type(o) is int: # o is an int
-            sub = int(self._w) - o
-            return self.__class__(sub)
-        elif isinstance(o, object): # o is an object
-            sub = int(self._w) - int(o._w)
-            return self.__class__(sub)
+        return self.__class__(self._w - int(o))
 
     def __and__(self, o):
-        vector_1 = str(bin(self._w).replace("0b", "")).zfill(16) # Refill with 0
-        vector_2 = str(bin(o._w).replace("0b", "")).zfill(16) # Refill with 0
-        
-        result = ""
-        for x in range(16):
-            result = result + str(int(vector_1[x]) & int(vector_2[x]))
-        result = int(result, 2) # Convert bin to int
-
-        return self.__class__(result)
+        return self.__class__(self._w & int(o) & self._ones)
 
     def __or__(self, o):
-        vector_1 = str(bin(self._w).replace("0b", "")).zfill(16) # Refill with 0
-        vector_2 = str(bin(o._w).replace("0b", "")).zfill(16) # Refill with 0
-        
-        result = ""
-        for x in range(16):
-            result = result + str(int(vector_1[x]) | int(vector_2[x]))
-        result = int(result, 2) # Convert bin to int
-
-        return self.__class__(result)
+        return self.__class__((self._w | int(o)) & self._ones)
 
     def __xor__(self, o):
-        vector_1 = str(bin(self._w).replace("0b", "")).zfill(16) # Refill with 0
-        vector_2 = str(bin(o._w).replace("0b", "")).zfill(16) # Refill with 0
-        
-        result = ""
-        for x in range(16):
-            result = result + str(int(vector_1[x]) ^ int(vector_2[x]))
-        result = int(result, 2) # Convert bin to int
-
-        return self.__class__(result)
+        return self.__class__((self._w ^ int(o)) & self._ones)
 
     def __invert__(self):
-        vector = str(bin(self._w).replace("0b", "")) # Extract 0b
-        vector = vector.zfill(len(vector))
-        
-        result = ""
-        for x in vector:
-            if x == "0":
-                result = result + "1"
-            elif x == "1":
-                result = result + "0"
-        result = int(result, 2) # Convert bin to int
-        return self.__class__(result)
+        return self.__class__(~self._w & self._ones)
 
     def __lshift__(self, i):
-        num = int(self._w)
-        bits = 8
-        try:
-            for x in range(i):
-                num <<= 1
-                if(bits):
-                    num |= 1
-                num &= (2**bits-1)
-            return Byte(num)
-        
-        except IndexError:
-            raise IndexError
+        """
+        Rotates the bits of self i positions to the left.
+        """
+        i = i % self._nbits if i > 0 else 0
+        num = self._w & self._ones
+        num = ((num << i) | (num >> (self._nbits - i))) & self._ones
+        return self.__class__(num)
             
     def __rshift__(self, i):
-        num = int(self._w)
-        bits = 8
-        try:
-            for x in range(i):
-                num &= (2**bits-1)
-                bit = num & 1
-                num >>= 1
-                if(bit):
-                    num |= (1 << (bits-1))
-            return Byte(num)
-        
-        except IndexError:
-            raise IndexError
+        """
+        Rotates the bits of self i positions to the right.
+        """
+        i = i % self._nbits if i > 0 else 0
+        num = self._w & self._ones
+        num = ((num >> i) | (num << (self._nbits - i))) & self._ones
+        return self.__class__(num)
 
     def __eq__(self, o):
-        vector_1 = str(bin(self._w).replace("0b", "")) # Extract 0b
-        vector_2 = str(bin(o._w).replace("0b", "")) # Extract 0b
-
-        if vector_1 == vector_2:
-            return True
-        else:
-            return False
+        return self._w == o._w
 
     def __getitem__(self, i):
-        vector = str(bin(self._w).replace("0b", "")) # Extract 0b
-        vector = vector.zfill(self.__len__())
-        try:
-            if vector[i] == '0':
-                return False
-            elif vector[i] == '1':
-                return True
-        except IndexError:
+        """
+        Returns the bit i of self. The bit 0 is the most significant
+        one.
+        """
+        if i < 0:
+            i = i + self._nbits
+        if i < 0 or i >= self._nbits:
             raise KeyError
+        return bool((self._w >> (self._nbits - 1 - i)) & 1)
 
     def __setitem__(self, i, v):
-        vector = str(bin(self._w).replace("0b", "")) # Extract 0b
-        vector = vector.zfill(self.__len__())
-        vector = list(vector)
-        try:
-            vector[i] = v
-            vector = self.__class__(int("".join(map(str,vector)), 2))
-            self._w = int(vector)
-        except IndexError:
+        """
+        Sets the bit i of self to v. The bit 0 is the most significant
+        one.
+        """
+        if i < 0:
+            i = i + self._nbits
+        if i < 0 or i >= self._nbits:
             raise KeyError
+        bit = 1 << (self._nbits - 1 - i)
+        if int(v):
+            self._w = self._w | bit
+        else:
+            self._w = self._w & ~bit
                 
 
 class Byte(BitVector):
     """
     Represents a word of 8 bits
     """
+    __slots__ = ()
+
+    _nbits = 8
+    _ones = 0xFF
+
     def __len__(self):
         return 8
 
@@ -208,18 +155,15 @@ class Byte(BitVector):
         :return: Word class 
         :rtype: object
         """
-        vector_1 = str(bin(self._w).replace("0b", "")).zfill(8) # Extract 0b
-        vector_2 = str(bin(b._w).replace("0b", "")).zfill(8) # Extract 0b
-
-        result = int(vector_1 + vector_2, 2)
-
-        return Word(result)
+        return Word(((self._w & 0xFF) << 8) | (b._w & 0xFF))
 
 
 class Word(BitVector):
     """
     Represent a word of 16 bits
     """
+    __slots__ = ()
+
     def __len__(self):
         return 16
 
@@ -227,20 +171,10 @@ class Word(BitVector):
         """
         Return the less significant byte
         """
-        list_self = bin(self._w).replace("0b", "") # Binary without 0b
-        list_self = list_self.zfill(16) # Fill with 0s
-        list_self = list(list_self) # Generate the list
-        result = "".join(list_self[8:self.__len__()]) # To str
-        result = int(result, 2) # Convert to int
-        return self.__class__(result)
+        return self.__class__(self._w & 0xFF)
         
     def msb(self):
         """
         Return the most significant byte
         """
-        list_self = bin(self._w).replace("0b", "") # Binary without 0b
-        list_self = list_self.zfill(16) # Fill with 0s
-        list_self = list(list_self) # Generate the list
-        result = "".join(list_self[0:8]) # To str
-        result = int(result, 2) # Convert to int
-        return self.__class__(result)
+        return self.__class__((self._w >> 8) & 0xFF)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from memory import ON_READ, ON_WRITE, ON_CHANGE
+
+NADDRS = 0x10000 # Addresses of the bitmaps, all the ones of a Word
+
+
+def register_is(reg, value):
+    """
+    Builds the condition of a breakpoint that holds when a register
+    has a value.
+
+    :param reg: Number of the register
+    :type reg: int
+    :param value: Value of the register
+    :type value: int
+
+    :return: Condition over a State
+    :rtype: function
+    """
+    def condition(state):
+        # Read from the buffer, so the watchpoints do not see it
+        return state.data._buf[reg] == value
+    return condition
+
+
+def flag_is(flag, value):
+    """
+    Builds the condition of a breakpoint that holds when a flag has a
+    value.
+
+    :param flag: Flag, C, Z or N of state
+    :type flag: int
+    :param value: Value of the flag, 0 or 1
+    :type value: int
+
+    :return: Condition over a State
+    :rtype: function
+    """
+    def condition(state):
+        return state.flags[flag] == value
+    return condition
+
+
+class Breakpoints(object):
+    """
+    Keeps the breakpoints and the watchpoints of a simulation. An
+    AvrMcu runs with its instrumented loop, that arms and checks them,
+    when its breakpoints have any, so the simulations without them do
+    not pay for the checks.
+
+    The addresses of program memory with a breakpoint are marked in a
+    bitmap, so every step costs a single lookup, and the conditions
+    are only evaluated on the marked addresses. As with until_pc, the
+    first instruction of a run is always executed, so a stop on a
+    breakpoint can be resumed.
+
+    The watchpoints are kept as a bitmap with the kinds of watchpoint
+    of every address of data memory, ON_READ, ON_WRITE or ON_CHANGE,
+    that is only armed on the data memory during the loop. The bank
+    calls read or write on the accesses to the marked addresses, and
+    the loop stops after the instruction that made the access.
+
+    :ivar hit: Address of the last breakpoint reached, or kind,
+        address, old content and new content of the last watchpoint
+        hit, or None
+    :vartype hit: int or tuple
+    """
+    def __init__(self):
+        self._pcs = bytearray(NADDRS) # 1 where there is a breakpoint
+        self._conditions = {} # Conditions of every breakpoint
+        self._watch = bytearray(NADDRS) # Kinds of watchpoint
+        self._watched = set() # Addresses with a watchpoint
+        self.hit = None
+
+    def __len__(self):
+        return len(self._conditions) + len(self._watched)
+
+    def add_breakpoint(self, pc, condition=None):
+        """
+        Sets a breakpoint on an address of program memory. With a
+        condition, the execution stops only when it holds. Several
+        breakpoints on the same address stop when any of them holds.
+
+        :param pc: Address of program memory
+        :type pc: int
+        :param condition: Function of the State that returns if the
+            execution stops, always if None
+        :type condition: function
+        """
+        self._pcs[pc] = 1
+        self._conditions.setdefault(pc, []).append(condition)
+
+    def remove_breakpoint(self, pc):
+        """
+        Removes the breakpoints of an address of program memory.
+
+        :param pc: Address of program memory
+        :type pc: int
+        """
+        self._pcs[pc] = 0
+        self._conditions.pop(pc, None)
+
+    def add_watchpoint(self, lo, hi=None, kind=ON_WRITE):
+        """
+        Sets a watchpoint on an address, or on a range, of data
+        memory.
+
+        :param lo: First address
+        :type lo: int
+        :param hi: Address after the last one, only lo if None
+        :type hi: int
+        :param kind: ON_READ, ON_WRITE, ON_CHANGE or an or of them
+        :type kind: int
+        """
+        for addr in range(lo, lo + 1 if hi is None else hi):
+            self._watch[addr] = self._watch[addr] | kind
+            self._watched.add(addr)
+
+    def remove_watchpoint(self, lo, hi=None):
+        """
+        Removes the watchpoints of an address, or of a range, of data
+        memory.
+
+        :param lo: First address
+        :type lo: int
+        :param hi: Address after the last one, only lo if None
+        :type hi: int
+        """
+        for addr in range(lo, lo + 1 if hi is None else hi):
+            self._watch[addr] = 0
+            self._watched.discard(addr)
+
+    def read(self, addr, value):
+        """
+        Called by the data memory on a read of a watched address.
+
+        :param addr: Address read
+        :type addr: int
+        :param value: Content read
+        :type value: int
+        """
+        if self.hit is None:
+            self.hit = (ON_READ, addr, value, value)
+
+    def write(self, addr, old, new):
+        """
+        Called by the data memory on a write of a watched address.
+
+        :param addr: Address written
+        :type addr: int
+        :param old: Content before the write
+        :type old: int
+        :param new: Content written
+        :type new: int
+        """
+        if self.hit is None:
+            kind = self._watch[addr]
+            if kind & ON_WRITE:
+                self.hit = (ON_WRITE, addr, old, new)
+            elif kind & ON_CHANGE and old != new:
+                self.hit = (ON_CHANGE, addr, old, new)
+
+    def describe(self):
+        """
+        Represents the last hit like this:
+
+        Breakpoint at 0X0003
+        Write 05 -> 06 to 0X0012
+
+        :return: Representation, or None if there is no hit
+        :rtype: str
+        """
+        if self.hit is None:
+            return None
+        if not isinstance(self.hit, tuple):
+            return "Breakpoint at 0X{0:04X}".format(self.hit)
+        kind, addr, old, new = self.hit
+        if kind == ON_READ:
+            return "Read {0:02X} from 0X{1:04X}".format(old, addr)
+        name = "Write" if kind == ON_WRITE else "Change"
+        return "{0} {1:02X} -> {2:02X} to 0X{3:04X}".format(name, old, new,
+                                                            addr)
+
+    def holds(self, pc, state):
+        """
+        Checks the conditions of the breakpoints of an address, and
+        keeps it as the hit if any holds.
+
+        :param pc: Address with a breakpoint
+        :type pc: int
+        :param state: State of the simulation
+        :type state: object from State
+
+        :return: True if the execution stops
+        :rtype: bool
+        """
+        for condition in self._conditions[pc]:
+            if condition is None or condition(state):
+                self.hit = pc
+                return True
+        return False
+
+    def arm(self, data):
+        """
+        Clears the last hit and arms the watchpoints on a data memory,
+        at the start of a run.
+
+        :param data: Data memory of the simulation
+        :type data: object from memory.DataMemory
+
+        :return: Bitmap of the addresses of program memory with a
+            breakpoint
+        :rtype: bytearray
+        """
+        self.hit = None
+        if self._watched:
+            data._watch = self._watch
+            data._watcher = self
+        return self._pcs
+
+    def disarm(self, data):
+        """
+        Disarms the watchpoints on a data memory, at the end of a run.
+
+        :param data: Data memory of the simulation
+        :type data: object from memory.DataMemory
+        """
+        data._watch = None
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import errno
+import fcntl
+import hashlib
+import tempfile
+import binascii
+
+from bitvec import Byte, Word
+from avrmcu import RunResult
+from ports import InputReplay, NPORTS
+
+MAX_BYTES = 64 * 1024 * 1024 # Default size of the entries of a cache
+LOCK = "lock" # File of the lock and the size of a shared cache
+STALE = 3600 # Seconds after which a temporary file is left by a crash
+
+# Modules whose code decides the result of a run, or its entry
+SOURCES = ("avrmcu", "bitvec", "cache", "compiler", "fusion", "idle",
+           "instruction", "memory", "ports", "repertoir", "state")
+
+_version = None # Version of the simulator, computed once
+
+def _replays(state):
+    """
+    Returns the replays bound on the ports of a state, once each, in
+    the order of their first port.
+    """
+    replays = []
+    for port in range(NPORTS):
+        handler = state.ports[port]
+        if isinstance(handler, InputReplay) and handler not in replays:
+            replays.append(handler)
+    return replays
+
+
+def simulator_version():
+    """
+    Returns the version of the simulator, that is a hash of the source
+    of the modules in SOURCES, so any change of them is a new version.
+
+    :return: Hexadecimal digest
+    :rtype: str
+    """
+    global _version
+    if _version is None:
+        digest = hashlib.sha1()
+        folder = os.path.dirname(os.path.abspath(__file__))
+        for name in SOURCES:
+            with open(os.path.join(folder, name + ".py"), "rb") as f:
+                digest.update(f.read())
+        _version = digest.hexdigest()
+    return _version
+
+
+def run_key(state, max_steps=None, until_pc=None, replay=None):
+    """
+    Returns the key of a run: a hash of the version of the simulator,
+    program memory, data memory, EEPROM, the registers and the cycles
+    of the state, the arguments of run and the input replayed, with
+    the records left on the replays bound.
+
+    :param state: State before the run
+    :type state: object from State
+    :param max_steps: Maximum instructions to execute, no limit if
+        None
+    :type max_steps: int
+    :param until_pc: Address where the execution stops
+    :type until_pc: int
+    :param replay: Path to the file of records of the input replayed,
+        no input if None
+    :type replay: str
+
+    :return: Hexadecimal digest
+    :rtype: str
+    """
+    prog = state.prog.get_raw()
+    if sys.byteorder == "big":
+        prog.byteswap() # The words as little endian on every host
+    if replay is None:
+        records, left = b"", []
+    else:
+        with open(replay, "rb") as f:
+            records = f.read()
+        left = [len(x) for x in _replays(state)]
+
+    digest = hashlib.sha256()
+    for x in (simulator_version(), prog.tostring(),
+              bytes(state.data.get_raw()), bytes(state.eeprom),
+              repr((int(state.pc), int(state.flags), state.cycles,
+                    max_steps, until_pc, replay is not None, left)),
+              records):
+        digest.update(str(len(x)) + ":")
+        digest.update(x)
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """
+    Keeps the results of deterministic runs in a directory, one JSON
+    file for each key of run_key, with the reason of the stop, the
+    counters, the final state and the output of the run.
+
+    Every entry is written to a temporary file and renamed, so a
+    reader never finds half an entry, and the writers of the same key
+    leave one of their entries, that are equal. The entries read are
+    touched, and when the entries take more than max_bytes the least
+    recently used ones are removed, with the temporary files older
+    than STALE seconds, left by writers that crashed. The size of the
+    entries is kept running, adding every entry written, so the
+    directory is only scanned when it passes max_bytes; as the
+    entries replaced are added too, it never falls short. An entry
+    stored without output is taken as missing by a run that keeps the
+    output, and replaced. If shared is set, the running size is kept
+    on a file locked by the writers, so it counts the entries of all
+    the processes, and they can write without removing more entries
+    than needed.
+
+    :param path: Directory of the cache, created if needed
+    :type path: str
+    :param max_bytes: Maximum size of the entries
+    :type max_bytes: int
+    :param shared: Lock the evictions, for several writers
+    :type shared: bool
+    :ivar hits: Runs found on the cache
+    :vartype hits: int
+    :ivar misses: Runs executed and stored
+    :vartype misses: int
+    """
+    def __init__(self, path, max_bytes=MAX_BYTES, shared=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self._size = None # Running size, unknown until the first scan
+        try:
+            os.makedirs(path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key + ".json")
+
+    def get(self, key):
+        """
+        Returns the entry of a key, and marks it as used.
+
+        :param key: Key of the run
+        :type key: str
+
+        :return: Entry, or None if it is not on the cache
+        :rtype: dict
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None # Missing, removed meanwhile or broken
+        return entry
+
+    def put(self, key, entry):
+        """
+        Stores the entry of a key, and removes the least recently used
+        entries if the cache is full.
+
+        :param key: Key of the run
+        :type key: str
+        :param entry: Entry, that JSON can write
+        :type entry: dict
+        """
+        fd, tmp = tempfile.mkstemp(".tmp", ".", self.path)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f, sort_keys=True)
+                size = f.tell()
+            os.rename(tmp, self._entry_path(key))
+        except Exception:
+            os.remove(tmp)
+            raise
+        self._grow(size)
+
+    def evict(self):
+        """
+        Removes the least recently used entries until they take
+        max_bytes at most, and the stale temporary files.
+        """
+        self._grow(None)
+
+    def _grow(self, size):
+        """
+        Adds the size of an entry written to the running size, and
+        evicts if it passes max_bytes, or if size is None. The running
+        size of a shared cache is read and written on LOCK, while the
+        file is locked.
+        """
+        if not self.shared:
+            self._size = self._account(self._size, size)
+            return
+        with open(os.path.join(self.path, LOCK), "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                text = f.read()
+                total = self._account(int(text) if text.isdigit() else None,
+                                      size)
+                f.seek(0)
+                f.truncate()
+                f.write(str(total))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _account(self, total, size):
+        # Scans only when the running size is unknown or too big
+        if size is None or total is None or total + size > self.max_bytes:
+            return self._evict()
+        return total + size
+
+    def _evict(self):
+        entries = []
+        stale = time.time() - STALE
+        for name in os.listdir(self.path):
+            if not name.endswith((".json", ".tmp")):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+                if name.endswith(".tmp"):
+                    if stat.st_mtime < stale:
+                        os.remove(path)
+                    continue
+            except OSError:
+                continue # Removed meanwhile
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(x[1] for x in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total = total - size
+        return total
+
+    def run(self, avrmcu, max_steps=None, until_pc=None, replay=None,
+            output=None):
+        """
+        Runs a simulator as AvrMcu.run, or, if the same run is on the
+        cache, sets the final state and the output without running it.
+        The run must be deterministic: its reads of the ports must find
+        no input, or the input replayed from the file given. The replays
+        bound take the records that the run read, hit or not, so the
+        next run goes on from the same point.
+
+        :param avrmcu: Simulator, with the state before the run
+        :type avrmcu: object from AvrMcu
+        :param max_steps: Maximum instructions to execute, no limit
+            if None
+        :type max_steps: int
+        :param until_pc: Address where the execution stops
+        :type until_pc: int
+        :param replay: Path to the file of records of the input
+            replayed, no input if None
+        :type replay: str
+        :param output: Buffer of the writes of the run, not kept if
+            None
+        :type output: object from ports.OutputBuffer
+
+        :return: Reason of the stop and instructions executed
+        :rtype: object from RunResult
+        """
+        start = time.time()
+        key = run_key(avrmcu._s, max_steps, until_pc, replay)
+        entry = self.get(key)
+        state = avrmcu._s
+
+        # An entry without output can not give the output asked for
+        if entry is not None and output is not None and \
+                entry["output"] is None:
+            entry = None
+
+        if entry is None:
+            self.misses = self.misses + 1
+            written = 0 if output is None else len(output.getvalue())
+            replays = _replays(state)
+            left = [len(x) for x in replays]
+            result = avrmcu.run(max_steps, until_pc)
+            self.put(key, {"reason": result.reason, "steps": result.steps,
+                           "message": result.message,
+                           "cycles": result.cycles,
+                           "pc": int(state.pc), "flags": int(state.flags),
+                           "total_cycles": state.cycles,
+                           "data": binascii.hexlify(state.data.get_raw()),
+                           "eeprom": binascii.hexlify(state.eeprom),
+                           "replayed": [x - len(y) for x, y in
+                                        zip(left, replays)],
+                           "output": None if output is None else
+                                     output.getvalue()[written:]})
+            return result
+
+        self.hits = self.hits + 1
+        state.data.set_raw(bytearray(binascii.unhexlify(entry["data"])))
+        state.eeprom = bytearray(binascii.unhexlify(entry["eeprom"]))
+        state.pc = Word(entry["pc"])
+        state.flags = Byte(entry["flags"])
+        state.cycles = entry["total_cycles"]
+        for handler, count in zip(_replays(state), entry["replayed"]):
+            handler.skip(count)
+        if output is not None and entry["output"]:
+            output.write_text(entry["output"])
+        return RunResult(entry["reason"], entry["steps"], entry["message"],
+                         entry["cycles"], time.time() - start)
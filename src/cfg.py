@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+
+from instruction import Rjmp, Brbs, Brbc, Break, Sts, Lds
+from repertoir import Unknown
+
+
+class BasicBlock(object):
+    """
+    Represents a basic block of the control-flow graph: a run of
+    instructions that is only entered by its first address and only
+    left by its last one.
+
+    :ivar start: Address of the first instruction
+    :vartype start: int
+    :ivar end: Address after the last instruction
+    :vartype end: int
+    :ivar succs: First addresses of the blocks that can follow it
+    :vartype succs: list of int
+    :ivar stops: The last instruction is a BREAK, or raises an error
+        on some path
+    :vartype stops: bool
+    """
+    __slots__ = ('start', 'end', 'succs', 'stops')
+
+    def __init__(self, start, end, succs, stops):
+        self.start = start
+        self.end = end
+        self.succs = succs
+        self.stops = stops
+
+    def __repr__(self):
+        return "Basic block 0X{0:04X}, {1} instructions".format(
+               self.start, self.end - self.start)
+
+
+class Cfg(object):
+    """
+    Represents the control-flow graph of the program reachable from an
+    entry, and what it tells before running it.
+
+    :ivar entry: Address where the execution starts
+    :vartype entry: int
+    :ivar blocks: Reachable basic blocks, by first address
+    :vartype blocks: dict
+    :ivar breaks: Reachable BREAK instructions
+    :vartype breaks: list of int
+    :ivar unknown: Reachable instructions that raise UnknownCodeError
+    :vartype unknown: list of int
+    :ivar out_of_mem: Reachable instructions that raise OutOfMemError,
+        always or when a branch goes out of program memory
+    :vartype out_of_mem: list of int
+    :ivar infinite: Reachable blocks that can reach no BREAK and no
+        error, so the execution never stops after entering them
+    :vartype infinite: list of int
+    :ivar unreachable: Ranges (first, after the last) of the cells of
+        program memory, but the zeros of NOP, that are not reachable
+    :vartype unreachable: list of tuples
+    """
+    def __init__(self, entry, blocks, breaks, unknown, out_of_mem,
+                 infinite, unreachable):
+        self.entry = entry
+        self.blocks = blocks
+        self.breaks = breaks
+        self.unknown = unknown
+        self.out_of_mem = out_of_mem
+        self.infinite = infinite
+        self.unreachable = unreachable
+
+    def reachable(self, addr):
+        """
+        Checks if an instruction can be executed from the entry.
+
+        :param addr: Address of program memory
+        :type addr: int
+
+        :return: True if a reachable block contains the address
+        :rtype: bool
+        """
+        return any(x.start <= addr < x.end for x in self.blocks.values())
+
+    def can_break(self):
+        """
+        Checks if the program can end on a BREAK. When it can not, the
+        execution from the entry can only end on an error or never.
+
+        :return: True if a BREAK is reachable
+        :rtype: bool
+        """
+        return bool(self.breaks)
+
+    def report(self):
+        """
+        Represents the analysis like this:
+
+        Blocks: 3, instructions: 5
+        Unknown code: 0X0004
+        Out of memory: 0X0007
+        Infinite loops: 0X0005
+        Unreachable: 0X0008-0X000B
+
+        :return: Representation
+        :rtype: str
+        """
+        def addrs(li):
+            return " ".join("0X{0:04X}".format(x) for x in li)
+
+        ninstr = sum(x.end - x.start for x in self.blocks.values())
+        lines = ["Blocks: {0}, instructions: {1}".format(len(self.blocks),
+                                                          ninstr)]
+        if self.unknown:
+            lines.append("Unknown code: " + addrs(self.unknown))
+        if self.out_of_mem:
+            lines.append("Out of memory: " + addrs(self.out_of_mem))
+        if self.infinite:
+            lines.append("Infinite loops: " + addrs(self.infinite))
+        if self.unreachable:
+            lines.append("Unreachable: " + " ".join(
+                         "0X{0:04X}-0X{1:04X}".format(x, y - 1)
+                         for x, y in self.unreachable))
+        return "\n".join(lines) + "\n"
+
+
+class CfgBuilder(object):
+    """
+    Builds the control-flow graph of a program with the decode table
+    of the simulator, without running it.
+
+    The edges are the targets of RJMP, BRBS and BRBC, with both ways
+    of every branch, and the fall-through to the next address. BREAK,
+    unknown codes and LDS or STS out of data memory have no edges,
+    and neither the jumps out of program memory. The blocks are split
+    at every target, so they are the blocks of the graph, not the
+    ones of the BlockCompiler, that end before IN and OUT too.
+
+    :param decode: Returns the decoded instruction of an address
+    :type decode: function
+    """
+    def __init__(self, decode):
+        self._decode = decode
+
+    def build(self, state, entry=0):
+        """
+        Builds the graph of the program of a state from an address.
+
+        :param state: State with the program
+        :type state: object from State
+        :param entry: Address where the execution starts
+        :type entry: int
+
+        :return: Control-flow graph
+        :rtype: object from Cfg
+        """
+        nprog, ndata = len(state.prog), len(state.data)
+        succs = {} # Next addresses of every reachable instruction
+        leaders = set([entry])
+        breaks, unknown, out_of_mem = [], [], []
+
+        # Instructions reachable from the entry
+        pending = [entry] if 0 <= entry < nprog else []
+        while pending:
+            addr = pending.pop()
+            if addr in succs:
+                continue
+            dec = self._decode(addr)
+            cls = dec.runner.__class__
+            if cls is Rjmp:
+                targets = [addr + dec.k + 1]
+                leaders.update(targets)
+            elif cls in (Brbs, Brbc):
+                targets = [addr + 1, addr + dec.k + 1]
+                leaders.update(targets)
+            elif cls is Break:
+                targets = []
+                breaks.append(addr)
+            elif cls is Unknown:
+                targets = []
+                unknown.append(addr)
+            elif cls in (Sts, Lds) and not dec.k < ndata:
+                targets = []
+                out_of_mem.append(addr)
+            else:
+                targets = [addr + 1]
+            if any(not 0 <= x < nprog for x in targets):
+                targets = [x for x in targets if 0 <= x < nprog]
+                out_of_mem.append(addr)
+            succs[addr] = targets
+            pending.extend(targets)
+
+        # Blocks, from every leader to the next leader or the last
+        # instruction with edges that are not a fall-through
+        stops = set(breaks + unknown + out_of_mem)
+        blocks = {}
+        for start in leaders:
+            if start not in succs:
+                continue
+            addr = start
+            while (succs[addr] == [addr + 1] and addr not in stops and
+                   addr + 1 not in leaders):
+                addr = addr + 1
+            blocks[start] = BasicBlock(start, addr + 1, sorted(
+                                       set(succs[addr])), addr in stops)
+
+        # Blocks that can reach a stop, following the edges backwards
+        preds = dict((x, []) for x in blocks)
+        for block in blocks.values():
+            for x in block.succs:
+                preds[x].append(block.start)
+        stopping = set(x for x in blocks if blocks[x].stops)
+        pending = list(stopping)
+        while pending:
+            for x in preds[pending.pop()]:
+                if x not in stopping:
+                    stopping.add(x)
+                    pending.append(x)
+        infinite = sorted(x for x in blocks if x not in stopping)
+
+        # Ranges of cells that are not NOP and are never executed
+        unreachable = []
+        buf = state.prog._buf
+        for addr in range(nprog):
+            if buf[addr] == 0 or addr in succs:
+                continue
+            if unreachable and unreachable[-1][1] == addr:
+                unreachable[-1] = (unreachable[-1][0], addr + 1)
+            else:
+                unreachable.append((addr, addr + 1))
+
+        return Cfg(entry, blocks, sorted(breaks), sorted(unknown),
+                   sorted(out_of_mem), infinite, unreachable)
+
+
+if __name__ == '__main__':
+    from avrmcu import AvrMcu
+
+    parser = argparse.ArgumentParser(description='AVR static analysis')
+    parser.add_argument('path',
+                        metavar='path',
+                        type=str,
+                        help='Path to the .hex file')
+    parser.add_argument('-e',
+                        type=int,
+                        default=0,
+                        help='Address where the execution starts')
+    args = parser.parse_args()
+
+    avrmcu = AvrMcu()
+    avrmcu.load_hex(args.path)
+    print avrmcu.analyze(args.e).report(),
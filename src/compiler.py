@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from bitvec import Word
+from instruction import Add, Adc, Sub, Subi, And, Or, Eor, Lsr, Mov, Ldi, Sts, Lds, Rjmp, Brbs, Brbc, Nop
+
+MAX_STEPS = 64 # Maximum number of instructions of a block
+
+# Bit of every flag in the int of the flags Byte
+FLAG_BITS = {"c": 7, "z": 6, "n": 5}
+
+
+class Block(object):
+    """
+    Represents a basic block compiled into a Python function. The
+    block runs the instructions from address start to start + steps - 1
+    with a single call of run, and leaves the state as the instructions
+    one by one would do.
+
+    :ivar start: Address of the first instruction
+    :vartype start: int
+    :ivar steps: Instructions of the block
+    :vartype steps: int
+    :ivar run: Function that executes the block on a State
+    :vartype run: function
+    :ivar source: Python source of run
+    :vartype source: str
+    """
+    __slots__ = ('start', 'steps', 'run', 'source')
+
+    def __init__(self, start, steps, run, source):
+        self.start = start
+        self.steps = steps
+        self.run = run
+        self.source = source
+
+    def __repr__(self):
+        return "Block 0X{0:04X}, {1} instructions".format(self.start,
+                                                          self.steps)
+
+
+NO_BLOCK = Block(-1, 0, None, "") # Stands for the cells where no block starts
+
+
+class BlockCompiler(object):
+    """
+    Translates the basic blocks of a program into Python functions.
+
+    A basic block is a run of instructions that ends after RJMP, BRBS
+    or BRBC, or before an instruction that can not be compiled: BREAK,
+    IN, OUT, unknown codes and accesses out of data memory. These are
+    left to the interpreter, so the compiled blocks never raise.
+
+    The function of a block loads the cells of data memory that it
+    uses in local variables, keeps the flags in local variables, and
+    writes both, PC and the cycle counter back once at the exit. The
+    assignments of flags that are overwritten before being read are
+    dropped. The code of every instruction follows its
+    execute_decoded, quirks included.
+
+    :param decode: Returns the decoded instruction of an address
+    :type decode: function
+    :param max_steps: Maximum number of instructions of a block
+    :type max_steps: int
+    """
+    def __init__(self, decode, max_steps=MAX_STEPS):
+        self._decode = decode
+        self._max_steps = max_steps
+        self._emit = {Add: self._add, Adc: self._add, Sub: self._sub,
+                      Subi: self._sub, And: self._logic, Or: self._logic,
+                      Eor: self._logic, Lsr: self._lsr, Mov: self._mov,
+                      Ldi: self._ldi, Sts: self._sts, Lds: self._lds,
+                      Nop: self._nop}
+
+    def compile(self, state, start):
+        """
+        Compiles the basic block that starts at an address.
+
+        :param state: State that will run the block
+        :type state: object from State
+        :param start: Address of the first instruction
+        :type start: int
+
+        :return: Compiled block, or NO_BLOCK if the first instruction
+            can not be compiled
+        :rtype: object from Block
+        """
+        self._ndata = len(state.data)
+        self._lines = []
+        self._cells = set() # Cells loaded in local variables
+        self._dirty = set() # Cells to write back
+        self._flags = set() # Flags to write back
+        self._unread = {} # Last assignment of each flag, if not read
+
+        addr = start
+        cycles = 0
+        branch = None
+        nprog = len(state.prog)
+        while addr < nprog and addr - start < self._max_steps:
+            dec = self._decode(addr)
+            runner = dec.runner
+            cls = runner.__class__
+            if cls in (Rjmp, Brbs, Brbc):
+                branch = dec
+            elif cls not in self._emit or not self._emit[cls](dec):
+                break
+            cycles = cycles + runner.cycles
+            addr = addr + 1
+            if branch is not None:
+                break
+
+        steps = addr - start
+        if steps == 0:
+            return NO_BLOCK
+
+        lines = self._lines
+        for x in sorted(self._dirty):
+            lines.append("buf[{0}] = m{0}".format(x))
+        if self._flags:
+            keep = 0xFF
+            value = ["f & 0x{0:02X}"]
+            for x in sorted(self._flags):
+                keep = keep & ~(1 << FLAG_BITS[x])
+                value.append("({0} << {1})".format(x, FLAG_BITS[x]))
+            lines.append("flags._w = " + " | ".join(value).format(keep))
+
+        if branch is None:
+            lines.append("state.pc = Word({0})".format(addr))
+            lines.append("state.cycles = state.cycles + {0}".format(cycles))
+        elif branch.runner.__class__ is Rjmp:
+            lines.append("state.pc = Word({0})".format(addr + branch.k))
+            lines.append("state.cycles = state.cycles + {0}".format(cycles))
+        else:
+            flag = self._flag(branch.s)
+            if branch.runner.__class__ is Brbc:
+                flag = "not " + flag
+            lines.append("if {0}:".format(flag))
+            lines.append("    state.pc = Word({0})".format(addr + branch.k))
+            lines.append("    state.cycles = state.cycles + {0}".format(
+                         cycles + 1))
+            lines.append("else:")
+            lines.append("    state.pc = Word({0})".format(addr))
+            lines.append("    state.cycles = state.cycles + {0}".format(
+                         cycles))
+
+        name = "block_{0:04X}".format(start)
+        source = "def {0}(state):\n".format(name)
+        # The buffer of a fork copies the pages shared before writing
+        source = source + "    buf = state.data._buf\n"
+        # Read the flags Byte without the property when no flag of the
+        # interpreter is pending
+        source = source + "    flags = state._flags\n"
+        source = source + "    if state._result is not None:\n"
+        source = source + "        flags = state.flags\n"
+        source = source + "    f = flags._w\n"
+        for x in lines:
+            if isinstance(x, list): # Assignment of a flag
+                if x[1] is None:
+                    continue
+                x = "{0} = {1}".format(*x)
+            source = source + "    {0}\n".format(x)
+
+        namespace = {"Word": Word}
+        exec compile(source, "<{0}>".format(name), "exec") in namespace
+        return Block(start, steps, namespace[name], source)
+
+    def _get(self, addr):
+        """
+        Returns the local variable of a cell of data memory, and loads
+        it the first time.
+        """
+        if addr not in self._cells:
+            self._lines.append("m{0} = buf[{0}]".format(addr))
+            self._cells.add(addr)
+        return "m{0}".format(addr)
+
+    def _set(self, addr):
+        """
+        Returns the local variable of a cell of data memory that is
+        going to be written.
+        """
+        self._cells.add(addr)
+        self._dirty.add(addr)
+        return "m{0}".format(addr)
+
+    def _flag(self, s):
+        """
+        Returns an expression with the value of the flag s.
+        """
+        for name, bit in FLAG_BITS.items():
+            if bit == 7 - s and name in self._flags:
+                self._unread.pop(name, None)
+                return name
+        return "((f >> {0}) & 1)".format(7 - s)
+
+    def _set_flags(self, c=None, z=None, n=None):
+        """
+        Emits the assignments of the flags given, and drops the
+        previous ones that have not been read.
+        """
+        for name, value in (("c", c), ("z", z), ("n", n)):
+            if value is not None:
+                if name in self._unread:
+                    self._unread[name][1] = None
+                line = [name, value]
+                self._lines.append(line)
+                self._unread[name] = line
+                self._flags.add(name)
+
+    def _fits(self, *addrs):
+        """
+        Checks that some addresses are inside data memory.
+        """
+        return all(0 <= x < self._ndata for x in addrs)
+
+    def _add(self, dec):
+        # Result on r, C set and 255 subtracted above 255, Z of the
+        # unmasked result
+        if not self._fits(dec.d, dec.r):
+            return False
+        d, r = self._get(dec.d), self._get(dec.r)
+        if dec.runner.__class__ is Adc:
+            self._lines.append("t = {0} + {1} + {2}".format(r, d,
+                               self._flag(0)))
+        else:
+            self._lines.append("t = {0} + {1}".format(r, d))
+        self._set_flags(c="t > 255")
+        self._lines.append("if t > 255:")
+        self._lines.append("    t = t - 255")
+        self._lines.append("{0} = t & 0xFF".format(self._set(dec.r)))
+        self._set_flags(z="t == 0", n="0")
+        return True
+
+    def _sub(self, dec):
+        # C set and 255 subtracted from 255 on, N of the unmasked result
+        if not self._fits(dec.d) or (dec.r is not None and
+                                     not self._fits(dec.r)):
+            return False
+        d = self._get(dec.d)
+        if dec.runner.__class__ is Subi:
+            self._lines.append("t = {0} - {1}".format(d, dec.K))
+        else:
+            self._lines.append("t = {0} - {1}".format(d, self._get(dec.r)))
+        self._set_flags(c="t >= 255")
+        self._lines.append("if t >= 255:")
+        self._lines.append("    t = t - 255")
+        self._lines.append("{0} = t & 0xFF".format(self._set(dec.d)))
+        self._set_flags(z="t == 0", n="t < 0")
+        return True
+
+    def _logic(self, dec):
+        if not self._fits(dec.d, dec.r):
+            return False
+        op = {And: "&", Or: "|", Eor: "^"}[dec.runner.__class__]
+        d, r = self._get(dec.d), self._get(dec.r)
+        self._lines.append("{0} = {0} {1} {2}".format(d, op, r))
+        self._set(dec.d)
+        self._set_flags(z="{0} == 0".format(d), n="0")
+        return True
+
+    def _lsr(self, dec):
+        # C from bit 7, rotated as a Byte and bit 0 cleared
+        if not self._fits(dec.d):
+            return False
+        d = self._get(dec.d)
+        self._set_flags(c="{0} >> 7".format(d))
+        self._lines.append("{0} = (({0} >> 1) | ({0} << 7)) & 0xFE".format(d))
+        self._set(dec.d)
+        self._set_flags(z="{0} == 0".format(d), n="0")
+        return True
+
+    def _mov(self, dec):
+        if not self._fits(dec.d, dec.r):
+            return False
+        r = self._get(dec.r)
+        self._lines.append("{0} = {1}".format(self._set(dec.d), r))
+        return True
+
+    def _ldi(self, dec):
+        if not self._fits(dec.d):
+            return False
+        self._lines.append("{0} = {1}".format(self._set(dec.d), dec.K))
+        return True
+
+    def _sts(self, dec):
+        # (k) <= Rr
+        if not self._fits(dec.k, dec.r):
+            return False
+        r = self._get(dec.r)
+        self._lines.append("{0} = {1}".format(self._set(dec.k), r))
+        return True
+
+    def _lds(self, dec):
+        # (k) <= Rd, as Lds.execute_decoded does
+        if not self._fits(dec.k, dec.d):
+            return False
+        d = self._get(dec.d)
+        self._lines.append("{0} = {1}".format(self._set(dec.k), d))
+        return True
+
+    def _nop(self, dec):
+        return True
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from bitvec import Word
+from state import C, Z, N
+from instruction import Add, Adc, Sub, Subi, And, Or, Eor, Lsr, Ldi, Sts, Lds, Brbs, Brbc
+
+# Names of the fusions
+SUB_BRANCH = "sub_branch" # SUB or SUBI, and BRBS or BRBC on C, Z or N
+LDI_LDI = "ldi_ldi" # Two LDI
+LDS_ALU_STS = "lds_alu_sts" # LDS, an ALU operation and STS
+
+
+class Fused(object):
+    """
+    Represents a sequence of instructions that the interpreter runs
+    with a single dispatch. The sequence runs the instructions from
+    address start to start + steps - 1 with a single call of run, and
+    leaves the state as the instructions one by one would do.
+
+    :ivar name: Name of the fusion
+    :vartype name: str
+    :ivar start: Address of the first instruction
+    :vartype start: int
+    :ivar steps: Instructions of the sequence
+    :vartype steps: int
+    :ivar run: Function that executes the sequence on a State
+    :vartype run: function
+    """
+    __slots__ = ('name', 'start', 'steps', 'run')
+
+    def __init__(self, name, start, steps, run):
+        self.name = name
+        self.start = start
+        self.steps = steps
+        self.run = run
+
+    def __repr__(self):
+        return "Fused {0} 0X{1:04X}, {2} instructions".format(self.name,
+                                                              self.start,
+                                                              self.steps)
+
+
+NO_FUSION = Fused(None, -1, 0, None) # Stands for the cells with no fusion
+
+
+#####################################################################
+# ALU operations on the buffer of data memory
+#####################################################################
+# They follow the execute_decoded of every instruction, quirks
+# included, and leave the flags pending on the state as they do.
+def _add(dec, state, buf):
+    # Result on r, C set and 255 subtracted above 255
+    t = buf[dec.r] + buf[dec.d]
+    if dec.runner.__class__ is Adc:
+        t = t + int(state.flags[C])
+    if t > 255:
+        t = t - 255
+        state._carry = 1
+    else:
+        state._carry = 0
+    buf[dec.r] = t & 0xFF
+    state._result = t
+
+
+def _sub(dec, state, buf):
+    # C set and 255 subtracted from 255 on, N of the unmasked result
+    t = buf[dec.d] - (dec.K if dec.r is None else buf[dec.r])
+    if t >= 255:
+        t = t - 255
+        state._carry = 1
+    else:
+        state._carry = 0
+    buf[dec.d] = t & 0xFF
+    state._result = t
+
+
+def _and(dec, state, buf):
+    t = buf[dec.d] & buf[dec.r]
+    buf[dec.d] = t
+    state._result = t
+
+
+def _or(dec, state, buf):
+    t = buf[dec.d] | buf[dec.r]
+    buf[dec.d] = t
+    state._result = t
+
+
+def _eor(dec, state, buf):
+    t = buf[dec.d] ^ buf[dec.r]
+    buf[dec.d] = t
+    state._result = t
+
+
+def _lsr(dec, state, buf):
+    # C from bit 7, rotated as a Byte and bit 0 cleared
+    t = buf[dec.d]
+    state._carry = t >> 7
+    t = ((t >> 1) | (t << 7)) & 0xFE
+    buf[dec.d] = t
+    state._result = t
+
+
+ALU = {Add: _add, Adc: _add, Sub: _sub, Subi: _sub, And: _and, Or: _or,
+       Eor: _eor, Lsr: _lsr}
+
+
+def _buffer(state):
+    """
+    Returns the buffer of data memory. The buffer of a fork copies
+    the pages shared before writing on them.
+    """
+    return state.data._buf
+
+
+#####################################################################
+# Fuser
+#####################################################################
+class Fuser(object):
+    """
+    Finds the fixed idioms of the programs, that are pairs and triples
+    of instructions, and builds a handler that runs each one with a
+    single dispatch of the interpreter:
+
+    - SUB_BRANCH: SUB or SUBI followed by BRBS or BRBC on the flag
+      that the subtraction sets. The branch is decided from the
+      result, without reading the flags.
+    - LDI_LDI: two LDI, as in the setup of registers.
+    - LDS_ALU_STS: LDS, an ALU operation and STS, as in a
+      read-modify-write of data memory.
+
+    The flags of every ALU operation are left pending on the state,
+    as the interpreter does, so the ones overwritten before being read
+    are never written. The sequences with accesses out of data memory
+    are not fused, so the handlers never raise.
+
+    :param decode: Returns the decoded instruction of an address
+    :type decode: function
+    """
+    def __init__(self, decode):
+        self._decode = decode
+
+    def fuse(self, state, start):
+        """
+        Builds the handler of the sequence that starts at an address,
+        trying the triples before the pairs.
+
+        :param state: State that will run the sequence
+        :type state: object from State
+        :param start: Address of the first instruction
+        :type start: int
+
+        :return: Fused sequence, or NO_FUSION if no idiom starts there
+        :rtype: object from Fused
+        """
+        self._ndata = len(state.data)
+        decs = []
+        for addr in range(start, min(start + 3, len(state.prog))):
+            decs.append(self._decode(addr))
+        classes = [x.runner.__class__ for x in decs] + [None] * 3
+
+        if (classes[0] is Lds and classes[1] in ALU and
+                classes[2] is Sts):
+            return self._lds_alu_sts(start, *decs)
+        if classes[0] in (Sub, Subi) and classes[1] in (Brbs, Brbc):
+            return self._sub_branch(start, decs[0], decs[1])
+        if classes[0] is Ldi and classes[1] is Ldi:
+            return self._ldi_ldi(start, decs[0], decs[1])
+        return NO_FUSION
+
+    def _fits(self, *addrs):
+        """
+        Checks that some addresses are inside data memory.
+        """
+        return all(x is None or 0 <= x < self._ndata for x in addrs)
+
+    def _sub_branch(self, start, sub, branch):
+        if branch.s not in (C, Z, N) or not self._fits(sub.d, sub.r):
+            return NO_FUSION
+        d, r, K, s = sub.d, sub.r, sub.K, branch.s
+        on_set = branch.runner.__class__ is Brbs
+        cycles = sub.runner.cycles + branch.runner.cycles
+        taken_pc, next_pc = start + 2 + branch.k, start + 2
+
+        def run(state):
+            buf = _buffer(state)
+            t = buf[d] - (K if r is None else buf[r])
+            if t >= 255:
+                t = t - 255
+                c = 1
+            else:
+                c = 0
+            buf[d] = t & 0xFF
+            state._carry = c
+            state._result = t
+            if s == C:
+                flag = c
+            elif s == Z:
+                flag = t == 0
+            else:
+                flag = t < 0
+            if bool(flag) == on_set:
+                state.pc = Word(taken_pc)
+                state.cycles = state.cycles + cycles + 1 # Taken
+            else:
+                state.pc = Word(next_pc)
+                state.cycles = state.cycles + cycles
+
+        return Fused(SUB_BRANCH, start, 2, run)
+
+    def _ldi_ldi(self, start, first, second):
+        if not self._fits(first.d, second.d):
+            return NO_FUSION
+        d1, K1, d2, K2 = first.d, first.K, second.d, second.K
+        cycles = first.runner.cycles + second.runner.cycles
+        next_pc = start + 2
+
+        def run(state):
+            buf = _buffer(state)
+            buf[d1] = K1
+            buf[d2] = K2
+            state.pc = Word(next_pc)
+            state.cycles = state.cycles + cycles
+
+        return Fused(LDI_LDI, start, 2, run)
+
+    def _lds_alu_sts(self, start, lds, alu, sts):
+        if not self._fits(lds.k, lds.d, alu.d, alu.r, sts.k, sts.r):
+            return NO_FUSION
+        k1, d1, k3, r3 = lds.k, lds.d, sts.k, sts.r
+        operate = ALU[alu.runner.__class__]
+        cycles = lds.runner.cycles + alu.runner.cycles + sts.runner.cycles
+        next_pc = start + 3
+
+        def run(state):
+            buf = _buffer(state)
+            buf[k1] = buf[d1] # (k) <= Rd, as Lds.execute_decoded does
+            operate(alu, state, buf)
+            buf[k3] = buf[r3]
+            state.pc = Word(next_pc)
+            state.cycles = state.cycles + cycles
+
+        return Fused(LDS_ALU_STS, start, 3, run)
+
+
+#####################################################################
+# Statistics
+#####################################################################
+class FusionStats(object):
+    """
+    Counts the fused sequences run by the interpreter, and the
+    dispatches that they saved, one less than their instructions.
+
+    :ivar fired: Runs of every fusion, by name
+    :vartype fired: dict
+    :ivar saved: Dispatches saved by every fusion, by name
+    :vartype saved: dict
+    """
+    def __init__(self):
+        self.fired = {}
+        self.saved = {}
+
+    def count(self, fused):
+        """
+        Counts a run of a fused sequence.
+
+        :param fused: Fused sequence
+        :type fused: object from Fused
+        """
+        self.fired[fused.name] = self.fired.get(fused.name, 0) + 1
+        self.saved[fused.name] = (self.saved.get(fused.name, 0) +
+                                  fused.steps - 1)
+
+    def total_saved(self):
+        """
+        Returns the dispatches saved by all the fusions.
+
+        :return: Dispatches saved
+        :rtype: int
+        """
+        return sum(self.saved.values())
+
+    def report(self):
+        """
+        Represents the statistics like this:
+
+        ldi_ldi: 1 runs, 1 dispatches saved
+        sub_branch: 750 runs, 750 dispatches saved
+        Total: 751 dispatches saved
+
+        :return: Representation
+        :rtype: str
+        """
+        lines = ["{0}: {1} runs, {2} dispatches saved".format(
+                 name, self.fired[name], self.saved[name])
+                 for name in sorted(self.fired)]
+        lines.append("Total: {0} dispatches saved".format(self.total_saved()))
+        return "\n".join(lines)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import binascii
+from array import array
+
+from avrexcep import HexFormatError
+
+DATA, EOF, EXT_SEGMENT, EXT_LINEAR = 0x00, 0x01, 0x02, 0x04 # Record types
+
+def records(f):
+    """
+    Reads the records of an Intel HEX file one by one, checking the
+    format and the checksum of each of them.
+
+    :param f: Lines of the file
+    :type f: file or iterable of str
+
+    :return: Type, address and data of each record
+    :rtype: generator of tuples (int, int, bytearray)
+    """
+    for num, line in enumerate(f):
+        line = line.strip()
+        if not line:
+            continue
+        if line[0] != ":" or len(line) % 2 == 0 or len(line) < 11:
+            raise HexFormatError("Line {0}: bad record".format(num + 1))
+
+        try:
+            raw = bytearray(binascii.unhexlify(line[1:]))
+        except (TypeError, ValueError):
+            raise HexFormatError("Line {0}: bad digits".format(num + 1))
+
+        if len(raw) != raw[0] + 5:
+            raise HexFormatError("Line {0}: bad length".format(num + 1))
+        if sum(raw) & 0xFF:
+            raise HexFormatError("Line {0}: bad checksum".format(num + 1))
+
+        yield raw[3], (raw[1] << 8) | raw[2], raw[4:-1]
+
+
+def read_hex(f):
+    """
+    Reads an Intel HEX file into a memory image. The record types
+    supported are data (00), end of file (01), extended segment
+    address (02) and extended linear address (04). The gaps between
+    data records are filled with 0xFF, as erased flash.
+
+    :param f: Lines of the file
+    :type f: file or iterable of str
+
+    :return: Address of the first byte and image
+    :rtype: tuple (int, bytearray)
+    """
+    base = 0 # Address added to the records
+    start = None
+    image = bytearray()
+
+    for rtype, addr, data in records(f):
+        if rtype == DATA:
+            addr = base + addr
+            if start is None:
+                start = addr
+            elif addr < start: # Data before the image, move it
+                image = bytearray(b"\xff" * (start - addr)) + image
+                start = addr
+            off = addr - start
+            if off > len(image):
+                image.extend(b"\xff" * (off - len(image)))
+            image[off:off + len(data)] = data
+        elif rtype == EOF:
+            break
+        elif rtype == EXT_SEGMENT:
+            base = ((data[0] << 8) | data[1]) << 4
+        elif rtype == EXT_LINEAR:
+            base = ((data[0] << 8) | data[1]) << 16
+        # Other types, such as start addresses, are not needed
+    else:
+        raise HexFormatError("Missing end of file record")
+
+    return (start or 0), image
+
+
+def to_words(image):
+    """
+    Converts an image of bytes into the little endian words of
+    program memory. If the length is odd, the last byte is padded with
+    0xFF.
+
+    :param image: Image of bytes
+    :type image: bytearray
+
+    :return: Words
+    :rtype: array('H')
+    """
+    if len(image) % 2:
+        image = image + bytearray(b"\xff")
+    words = array('H')
+    words.fromstring(bytes(image))
+    if sys.byteorder == 'big':
+        words.byteswap()
+    return words
+
+
+def load_hex(path):
+    """
+    Reads an Intel HEX file of a program.
+
+    :param path: Path to the .hex file
+    :type path: str
+
+    :return: Word address of the first instruction and instructions
+    :rtype: tuple (int, array('H'))
+    """
+    with open(path) as f:
+        start, image = read_hex(f)
+    if start % 2:
+        raise HexFormatError("Program not aligned to words")
+    return start // 2, to_words(image)
+
+
+def load_eep(path):
+    """
+    Reads an Intel HEX file of EEPROM. The image starts at address 0,
+    with 0xFF before the first data byte.
+
+    :param path: Path to the .eep.hex file
+    :type path: str
+
+    :return: Content of EEPROM
+    :rtype: bytearray
+    """
+    with open(path) as f:
+        start, image = read_hex(f)
+    return bytearray(b"\xff" * start) + image
+
+
+def eep_path(path):
+    """
+    Returns the path of the .eep.hex file that matches a .hex file.
+
+    :param path: Path to the .hex file
+    :type path: str
+
+    :return: Path to the .eep.hex file
+    :rtype: str
+    """
+    if path.endswith(".hex"):
+        path = path[:-len(".hex")]
+    return path + ".eep.hex"
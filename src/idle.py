@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from instruction import Nop, In, Rjmp, Brbs, Brbc, Ldi, Mov, And, Or
+
+MAX_STEPS = 16 # Maximum number of instructions of an idle loop
+WAIT = 0.05 # Seconds of every wait for an input event
+
+# Instructions that can leave the state as it is, but PC and the cycle
+# counter: IN when the port is not ready, LDI and MOV when the register
+# already has the value, and AND and OR of a register with itself, that
+# test it
+NO_EFFECT = (Nop, In, Rjmp, Brbs, Brbc, Ldi, Mov, And, Or)
+
+
+class IdleLoop(object):
+    """
+    Represents a loop that comes back to its first address without
+    changing the state, but PC and the cycle counter, as long as the
+    ports that it reads are not ready.
+
+    :ivar start: Address of the first instruction
+    :vartype start: int
+    :ivar steps: Instructions of an iteration
+    :vartype steps: int
+    :ivar cycles: Cycles of an iteration
+    :vartype cycles: int
+    :ivar addrs: Addresses of the instructions of an iteration
+    :vartype addrs: list of int
+    :ivar ports: Ports read by IN in an iteration
+    :vartype ports: list of int
+    """
+    __slots__ = ('start', 'steps', 'cycles', 'addrs', 'ports')
+
+    def __init__(self, start, steps, cycles, addrs, ports):
+        self.start = start
+        self.steps = steps
+        self.cycles = cycles
+        self.addrs = addrs
+        self.ports = ports
+
+    def __repr__(self):
+        return "Idle loop 0X{0:04X}, {1} instructions, {2} cycles".format(
+               self.start, self.steps, self.cycles)
+
+
+class IdleDetector(object):
+    """
+    Finds the loops where the programs wait, as a RJMP to itself or a
+    short loop that polls a port with IN, tests the register with AND
+    or OR and branches on the result.
+
+    An address can start an idle loop only if a path of at most
+    max_steps instructions of NO_EFFECT comes back to it, taking the
+    branches either way. This is checked once, and kept on program
+    memory until it is written. Whether the loop is idle is found by
+    following it from the state: an iteration must leave the registers
+    and the flags as they are, so every iteration after it goes the
+    same way.
+
+    :param decode: Returns the decoded instruction of an address
+    :type decode: function
+    :param max_steps: Maximum number of instructions of a loop
+    :type max_steps: int
+    """
+    def __init__(self, decode, max_steps=MAX_STEPS):
+        self._decode = decode
+        self._max_steps = max_steps
+
+    def can_idle(self, state, start):
+        """
+        Checks if a path of instructions without effects comes back to
+        an address.
+
+        :param state: State that runs the program
+        :type state: object from State
+        :param start: Address of the first instruction
+        :type start: int
+
+        :return: True if an idle loop can start at the address
+        :rtype: bool
+        """
+        return self.reach(state, start)[0]
+
+    def reach(self, state, start):
+        """
+        Checks as can_idle, and returns the interval of addresses
+        read, that program memory keeps to know when to check again.
+
+        :param state: State that runs the program
+        :type state: object from State
+        :param start: Address of the first instruction
+        :type start: int
+
+        :return: If an idle loop can start at the address, first
+            address read and address after the last one
+        :rtype: tuple
+        """
+        nprog = len(state.prog)
+        seen = set()
+        pending = [start]
+        while pending and len(seen) < self._max_steps:
+            addr = pending.pop()
+            if addr in seen or not 0 <= addr < nprog:
+                continue
+            seen.add(addr)
+            dec = self._decode(addr)
+            cls = dec.runner.__class__
+            if cls not in NO_EFFECT or (cls in (And, Or) and dec.d != dec.r):
+                continue
+            if cls is Rjmp:
+                targets = [addr + dec.k + 1]
+            elif cls in (Brbs, Brbc):
+                targets = [addr + 1, addr + dec.k + 1]
+            else:
+                targets = [addr + 1]
+            if start in targets:
+                return True, min(seen), max(seen) + 1
+            pending.extend(targets)
+        if not seen:
+            return False, start, start + 1
+        return False, min(seen), max(seen) + 1
+
+    def find(self, state, start):
+        """
+        Follows the instructions from an address with the registers
+        and the flags of the state, and returns the loop if they come
+        back to it leaving them as they are.
+
+        :param state: State that runs the program
+        :type state: object from State
+        :param start: Address of the first instruction
+        :type start: int
+
+        :return: Idle loop, or None if the instructions leave it or
+            have effects
+        :rtype: object from IdleLoop
+        """
+        flags = first = int(state.flags)
+        buf = state.data._buf
+        nprog, ndata = len(state.prog), len(buf)
+        addr, cycles = start, 0
+        addrs, ports = [], []
+        while len(addrs) < self._max_steps and 0 <= addr < nprog:
+            dec = self._decode(addr)
+            runner = dec.runner
+            cls = runner.__class__
+            if cls not in NO_EFFECT:
+                return None
+            if cls is Ldi and not (dec.d < ndata and buf[dec.d] == dec.K):
+                return None
+            if cls is Mov and not (dec.d < ndata and dec.r < ndata and
+                                   buf[dec.d] == buf[dec.r]):
+                return None
+            if cls in (And, Or):
+                if dec.d != dec.r or dec.d >= ndata:
+                    return None
+                # ZERO of the register, NEG cleared and CARRY kept
+                flags = (flags & 0x9F) | (0x40 if buf[dec.d] == 0 else 0)
+            addrs.append(addr)
+            cycles = cycles + runner.cycles
+            if cls is Rjmp:
+                addr = addr + dec.k + 1
+            elif cls in (Brbs, Brbc):
+                if bool((flags >> (7 - dec.s)) & 1) == (cls is Brbs):
+                    addr = addr + dec.k + 1
+                    cycles = cycles + 1 # Taken
+                else:
+                    addr = addr + 1
+            else:
+                if cls is In:
+                    ports.append(dec.A)
+                addr = addr + 1
+            if addr == start:
+                if flags != first:
+                    return None
+                return IdleLoop(start, len(addrs), cycles, addrs, ports)
+        return None
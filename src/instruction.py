@@ -8,11 +8,53 @@ from state import State
 
 C, Z, N = 0, 1, 2 # CARRY, ZERO, NEG
 
+class Decoded(object):
+    """
+    Represents an instruction already decoded: the InstRunner that
+    executes it and its operands as integers. The operands that the
+    instruction does not have are None.
+
+    :ivar runner: Instruction that executes the record
+    :vartype runner: object from InstRunner
+    :ivar d: Destination register
+    :vartype d: int
+    :ivar r: Source register
+    :vartype r: int
+    :ivar K: Constant
+    :vartype K: int
+    :ivar k: Address or offset
+    :vartype k: int
+    :ivar s: Bit of the status register
+    :vartype s: int
+    :ivar A: I/O port
+    :vartype A: int
+    """
+    __slots__ = ('runner', 'd', 'r', 'K', 'k', 's', 'A')
+
+    def __init__(self, runner, d=None, r=None, K=None, k=None, s=None, A=None):
+        self.runner = runner
+        self.d = d
+        self.r = r
+        self.K = K
+        self.k = k
+        self.s = s
+        self.A = A
+
+
 class InstRunner(object):
     """
     This class is abstract, is the superclass of all the instructions
     and contains the common methods between all of them.
+
+    Every instruction adds its cycles to the cycle counter of the
+    state when executed. Conditional branches add one more cycle when
+    they are taken.
+
+    :ivar cycles: Cycles of the instruction on the real MCU
+    :vartype cycles: int
     """
+    cycles = 1
+
     def __repr__(self):
         return self.name
 
@@ -30,6 +72,20 @@ class InstRunner(object):
 
         return instr == self._code
 
+    def decode(self, instr):
+        """
+        Decodes an instruction once, extracting its operands as
+        integers. The result can be executed many times with
+        execute_decoded without decoding the instruction again.
+
+        :param instr: Instruction to be decoded
+        :type instr: object from Word
+
+        :return: Decoded instruction
+        :rtype: object from Decoded
+        """
+        return Decoded(self)
+
     def execute(self, instr, state):
         """
         Executes an instruction and as a result, modifies the state of
@@ -45,6 +101,18 @@ class InstRunner(object):
         :param state: State to modify
         :type state: object from State
         """
+        self.execute_decoded(self.decode(instr), state)
+
+    def execute_decoded(self, dec, state):
+        """
+        Executes an instruction already decoded, from step (2) of
+        execute.
+
+        :param dec: Decoded instruction
+        :type dec: object from Decoded
+        :param state: State to modify
+        :type state: object from State
+        """
         pass
 
 
@@ -76,26 +144,21 @@ class Add(InstRunner):
         self.name = "Add"
         self._mask = "1111110000000000"
         self._code = "0b0000110000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
-
-        # Extract register R
-        reg_r = str(int(instr[6]))
-        for x in range(12,16):
-            reg_r = reg_r + str(int(instr[x]))
-        reg_r = int(reg_r, 2) # Convert to int
-
-        # Extract register G
-        reg_d = ""
-        for x in range(7,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) # Convert to int
-        
+    def decode(self, instr):
+        instr = int(instr)
+
+        # Extract registers Rr and Rd
+        reg_r = ((instr >> 5) & 0x10) | (instr & 0xF)
+        reg_d = (instr >> 4) & 0x1F
+
+        return Decoded(self, d=reg_d, r=reg_r)
+
+    def execute_decoded(self, dec, state):
         # Extract content of registers
-        vector_r = state.data[reg_r]
-        vector_d = state.data[reg_d]
+        vector_r = state.data[dec.r]
+        vector_d = state.data[dec.d]
 
         # Operate with contents of registers
         result = vector_r + vector_d
@@ -103,22 +166,20 @@ class Add(InstRunner):
         # Extract the carry
         if int(result) > 255:
             result = result - 255
-            # Flag CARRY
-            state.flags[C] = 1
+            carry = 1
         else:
-            state.flags[C] = 0
+            carry = 0
 
         # Assign the result to the register
-        state.data[reg_r] = result
+        state.data[dec.r] = result
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
         
-        # Flag NEG
-        state.flags[N] = int(bin(result)[0] == '-')
-        
-        # Flag ZERO
-        state.flags[Z] = int(int(result) == 0)
+        # Flags CARRY, NEG and ZERO, written when they are read
+        state._carry = carry
+        state._result = int(result)
 
 
 class Adc(InstRunner):
@@ -149,26 +210,21 @@ class Adc(InstRunner):
         self.name = "Adc"
         self._mask = "1111110000000000"
         self._code = "0b0001110000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
-
-        # Extract register R
-        reg_r = str(int(instr[6]))
-        for x in range(12,16):
-            reg_r = reg_r + str(int(instr[x]))
-        reg_r = int(reg_r, 2) # Convert to int
-
-        # Extract register G
-        reg_d = ""
-        for x in range(7,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) # Convert to int
-        
+    def decode(self, instr):
+        instr = int(instr)
+
+        # Extract registers Rr and Rd
+        reg_r = ((instr >> 5) & 0x10) | (instr & 0xF)
+        reg_d = (instr >> 4) & 0x1F
+
+        return Decoded(self, d=reg_d, r=reg_r)
+
+    def execute_decoded(self, dec, state):
         # Extract content of registers
-        vector_r = state.data[reg_r]
-        vector_d = state.data[reg_d]
+        vector_r = state.data[dec.r]
+        vector_d = state.data[dec.d]
 
         # Operate with contents of registers
         result = vector_r + vector_d + int(state.flags[C])
@@ -176,22 +232,20 @@ class Adc(InstRunner):
         # Extract the carry
         if int(result) > 255:
             result = result - 255
-            # Flag CARRY
-            state.flags[C] = 1
+            carry = 1
         else:
-            state.flags[C] = 0
+            carry = 0
 
         # Assign the result to the register
-        state.data[reg_r] = result
+        state.data[dec.r] = result
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
         
-        # Flag NEG
-        state.flags[N] = int(bin(result)[0] == '-')
-        
-        # Flag ZERO
-        state.flags[Z] = int(int(result) == 0)
+        # Flags CARRY, NEG and ZERO, written when they are read
+        state._carry = carry
+        state._result = int(result)
 
 
 class Sub(InstRunner):
@@ -225,26 +279,21 @@ class Sub(InstRunner):
         self.name = "Sub"
         self._mask = "1111110000000000"
         self._code = "0b0001100000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
+    def decode(self, instr):
+        instr = int(instr)
 
-        # Extract register Rr
-        reg_r = str(int(instr[6]))
-        for x in range(12,16):
-            reg_r = reg_r + str(int(instr[x]))
-        reg_r = int(reg_r, 2) # Convert to int
+        # Extract registers Rr and Rd
+        reg_r = ((instr >> 5) & 0x10) | (instr & 0xF)
+        reg_d = (instr >> 4) & 0x1F
 
-        # Extract register Rd
-        reg_d = ""
-        for x in range(7,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) # Convert to int
+        return Decoded(self, d=reg_d, r=reg_r)
 
+    def execute_decoded(self, dec, state):
         # Extract content of registers
-        vector_d = state.data[reg_d]
-        vector_r = state.data[reg_r]
+        vector_d = state.data[dec.d]
+        vector_r = state.data[dec.r]
         
         # Operate with contents of registers
         result = vector_d - vector_r
@@ -252,22 +301,20 @@ class Sub(InstRunner):
         # Extract the carry
         if int(result) >= 255:
             result = result - 255
-            # Flag CARRY
-            state.flags[C] = 1
+            carry = 1
         else:
-            state.flags[C] = 0
+            carry = 0
 
         # Assign the result to the register
-        state.data[reg_d] = result
+        state.data[dec.d] = result
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
 
-        # Flag NEG
-        state.flags[N] = int(bin(result)[0] == '-')
-        
-        # Flag ZERO
-        state.flags[Z] = int(int(result) == 0)
+        # Flags CARRY, NEG and ZERO, written when they are read
+        state._carry = carry
+        state._result = int(result)
 
 
 class Subi(InstRunner):
@@ -303,50 +350,43 @@ class Subi(InstRunner):
         self.name = "Add"
         self._mask = "1111000000000000"
         self._code = "0b0101000000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
+    def decode(self, instr):
+        instr = int(instr)
 
         # Extract constant
-        K = ""
-        for x in range(4,7):
-            K = K + str(int(instr[x]))
-        for x in range(12,16):
-            K = K + str(int(instr[x]))
-        K = int(K, 2) # Convert to int
+        K = ((instr >> 5) & 0x70) | (instr & 0xF)
 
         # Extract register Rd
-        reg_d = ""
-        for x in range(7,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) + 16 # Convert to int
+        reg_d = ((instr >> 4) & 0x1F) + 16
+
+        return Decoded(self, d=reg_d, K=K)
 
+    def execute_decoded(self, dec, state):
         # Extract content of register d
-        vector_d = state.data[reg_d]
+        vector_d = state.data[dec.d]
         
         # Operate with contents of registers
-        result = vector_d - K
+        result = vector_d - dec.K
 
         # Extract the carry
         if int(result) >= 255:
             result = result - 255
-            # Flag CARRY
-            state.flags[C] = 1
+            carry = 1
         else:
-            state.flags[C] = 0
+            carry = 0
 
         # Assign the result to the register
-        state.data[reg_d] = result
+        state.data[dec.d] = result
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
 
-        # Flag NEG
-        state.flags[N] = int(bin(result)[0] == '-')
-        
-        # Flag ZERO
-        state.flags[Z] = int(int(result) == 0)
+        # Flags CARRY, NEG and ZERO, written when they are read
+        state._carry = carry
+        state._result = int(result)
 
 
 class And(InstRunner):
@@ -377,41 +417,34 @@ class And(InstRunner):
         self.name = "And"
         self._mask = "1111110000000000"
         self._code = "0b0010000000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
+    def decode(self, instr):
+        instr = int(instr)
 
-        # Extract register Rr
-        reg_r = str(int(instr[6]))
-        for x in range(12,16):
-            reg_r = reg_r + str(int(instr[x]))
-        reg_r = int(reg_r, 2) # Convert to int
+        # Extract registers Rr and Rd
+        reg_r = ((instr >> 5) & 0x10) | (instr & 0xF)
+        reg_d = (instr >> 4) & 0x1F
 
-        # Extract register Rd
-        reg_d = ""
-        for x in range(7,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) # Convert to int
+        return Decoded(self, d=reg_d, r=reg_r)
 
+    def execute_decoded(self, dec, state):
         # Extract content of registers
-        vector_d = state.data[reg_d]
-        vector_r = state.data[reg_r]
-
+        vector_d = state.data[dec.d]
+        vector_r = state.data[dec.r]
+        
         # Operate with contents of registers
-        result  = vector_d & vector_r
+        result = vector_d & vector_r
 
         # Assign the result to the register
-        state.data[reg_d] = result
+        state.data[dec.d] = result
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
 
-        # Flag NEG
-        state.flags[N] = int(bin(result)[0] == '-')
-        
-        # Flag ZERO
-        state.flags[Z] = int(int(result) == 0)
+        # Flags NEG and ZERO, written when they are read
+        state._result = int(result)
 
 
 class Or(InstRunner):
@@ -441,41 +474,34 @@ class Or(InstRunner):
         self.name = "Or"
         self._mask = "1111110000000000"
         self._code = "0b0010100000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
+    def decode(self, instr):
+        instr = int(instr)
 
-        # Extract register Rr
-        reg_r = str(int(instr[6]))
-        for x in range(12,16):
-            reg_r = reg_r + str(int(instr[x]))
-        reg_r = int(reg_r, 2) # Convert to int
+        # Extract registers Rr and Rd
+        reg_r = ((instr >> 5) & 0x10) | (instr & 0xF)
+        reg_d = (instr >> 4) & 0x1F
 
-        # Extract register Rd
-        reg_d = ""
-        for x in range(7,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) # Convert to int
+        return Decoded(self, d=reg_d, r=reg_r)
 
+    def execute_decoded(self, dec, state):
         # Extract content of registers
-        vector_d = state.data[reg_d]
-        vector_r = state.data[reg_r]
+        vector_d = state.data[dec.d]
+        vector_r = state.data[dec.r]
         
         # Operate with contents of registers
         result = vector_d | vector_r
 
         # Assign the result to the register
-        state.data[reg_d] = result
+        state.data[dec.d] = result
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
 
-        # Flag NEG
-        state.flags[N] = int(bin(result)[0] == '-')
-        
-        # Flag ZERO
-        state.flags[Z] = int(int(result) == 0)
+        # Flags NEG and ZERO, written when they are read
+        state._result = int(result)
 
 
 class Eor(InstRunner):
@@ -505,41 +531,34 @@ class Eor(InstRunner):
         self.name = "Eor"
         self._mask = "1111110000000000"
         self._code = "0b0010010000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
+    def decode(self, instr):
+        instr = int(instr)
 
-        # Extract register Rr
-        reg_r = str(int(instr[6]))
-        for x in range(12,16):
-            reg_r = reg_r + str(int(instr[x]))
-        reg_r = int(reg_r, 2) # Convert to int
+        # Extract registers Rr and Rd
+        reg_r = ((instr >> 5) & 0x10) | (instr & 0xF)
+        reg_d = (instr >> 4) & 0x1F
 
-        # Extract register Rd
-        reg_d = ""
-        for x in range(7,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) # Convert to int
+        return Decoded(self, d=reg_d, r=reg_r)
 
+    def execute_decoded(self, dec, state):
         # Extract content of registers
-        vector_d = state.data[reg_d]
-        vector_r = state.data[reg_r]
+        vector_d = state.data[dec.d]
+        vector_r = state.data[dec.r]
         
         # Operate with contents of registers
         result = vector_d ^ vector_r
 
         # Assign the result to the register
-        state.data[reg_d] = result
+        state.data[dec.d] = result
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
 
-        # Flag NEG
-        state.flags[N] = int(bin(result)[0] == '-')
-        
-        # Flag ZERO
-        state.flags[Z] = int(int(result) == 0)
+        # Flags NEG and ZERO, written when they are read
+        state._result = int(result)
 
 
 class Lsr(InstRunner):
@@ -571,38 +590,38 @@ class Lsr(InstRunner):
         self.name = "Lsr"
         self._mask = "1111111000001111"
         self._code = "0b1001010000000110"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
+    def decode(self, instr):
+        instr = int(instr)
 
         # Extract reg_d
-        reg_d = ""
-        for x in range(7,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) # Convert to int
+        reg_d = (instr >> 4) & 0x1F
 
+        return Decoded(self, d=reg_d)
+
+    def execute_decoded(self, dec, state):
         # Extract content of register d
-        vector_d = state.data[reg_d]
+        vector_d = state.data[dec.d]
 
-        # Flag CARRY
-        state.flags[C] = int(vector_d[0])
+        # Flag CARRY, written when it is read
+        carry = int(vector_d[0])
 
-        # Operate with contents of registers
-        result = vector_d >> 1
+        # Operate with contents of registers, rotating as a Byte
+        result = Byte(int(vector_d)) >> 1
         result[7] = 0
 
         # Assign the result to the register
-        state.data[reg_d] = result
+        state.data[dec.d] = result
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
 
-        # Flag NEG
-        state.flags[N] = 0
-
-        # Flag ZERO
-        state.flags[Z] = int(int(result) == 0)
+        # Flags CARRY, NEG and ZERO, written when they are read. NEG is
+        # cleared, as the result is not negative
+        state._carry = carry
+        state._result = int(result)
 
 
 class Mov(InstRunner):
@@ -628,31 +647,27 @@ class Mov(InstRunner):
         self.name = "Mov"
         self._mask = "1111110000000000"
         self._code = "0b0010110000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
+    def decode(self, instr):
+        instr = int(instr)
 
-        # Extract register Rr
-        reg_r = str(int(instr[6]))
-        for x in range(12,16):
-            reg_r = reg_r + str(int(instr[x]))
-        reg_r = int(reg_r, 2) # Convert to int
+        # Extract registers Rr and Rd
+        reg_r = ((instr >> 5) & 0x10) | (instr & 0xF)
+        reg_d = (instr >> 4) & 0x1F
 
-        # Extract register Rd
-        reg_d = ""
-        for x in range(7,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) # Convert to int
+        return Decoded(self, d=reg_d, r=reg_r)
 
+    def execute_decoded(self, dec, state):
         # Extract content of registers
-        result = state.data[reg_r]
+        result = state.data[dec.r]
 
         # Assign the result to the register
-        state.data[reg_d] = result
+        state.data[dec.d] = result
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
 
 
 class Ldi(InstRunner):
@@ -676,31 +691,26 @@ class Ldi(InstRunner):
         self.name = "Ldi"
         self._mask = "1111000000000000"
         self._code = "0b1110000000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
+    def decode(self, instr):
+        instr = int(instr)
 
-        # Extract register d
-        reg_d = ""
-        for x in range(8,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) # Convert to int
-        reg_d = reg_d + 16 # Start on 16
+        # Extract register d, starting on 16
+        reg_d = ((instr >> 4) & 0xF) + 16
 
         # Extract value K
-        value_k = ""
-        for x in range(4,8):
-            value_k = value_k + str(int(instr[x]))
-        for x in range(12,16):
-            value_k = value_k + str(int(instr[x]))
-        value_k = int(value_k, 2) # Convert to int
-        
+        value_k = ((instr >> 4) & 0xF0) | (instr & 0xF)
+
+        return Decoded(self, d=reg_d, K=value_k)
+
+    def execute_decoded(self, dec, state):
         # Asign value k to register d        
-        state.data[reg_d] = value_k
+        state.data[dec.d] = dec.K
         
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
 
 
 class Sts(InstRunner):
@@ -741,31 +751,26 @@ class Sts(InstRunner):
         self.name = "Sts"
         self._mask = "1111111000000000"
         self._code = "0b1001001000000000"
+        self.cycles = 2
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
-
-        # Extract memory adress k
-        mem_k = ""
-        for x in range(5,8):
-            mem_k = mem_k + str(int(instr[x]))
-        for x in range(12,16):
-            mem_k = mem_k + str(int(instr[x]))
-        mem_k = mem_k[0] +  mem_k # Add 8 number
-        mem_k = int(mem_k, 2) # Convert to int
+    def decode(self, instr):
+        instr = int(instr)
 
-        # Extract register Rd
-        reg_r = ""
-        for x in range(7,12):
-            reg_r = reg_r + str(int(instr[x]))
-        reg_r = int(reg_r, 2) # Convert to int
-        
+        # Extract memory adress k, bit 7 is a copy of bit 6
+        mem_k = ((instr >> 3) & 0x80) | ((instr >> 4) & 0x70) | (instr & 0xF)
+
+        # Extract register Rr
+        reg = (instr >> 4) & 0x1F
+
+        return Decoded(self, r=reg, k=mem_k)
+
+    def execute_decoded(self, dec, state):
         # Assign the result to the register
-        state.data[mem_k] = state.data[reg_r]
+        state.data[dec.k] = state.data[dec.r]
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
 
 
 class Lds(InstRunner):
@@ -805,31 +810,26 @@ class Lds(InstRunner):
         self.name = "Lds"
         self._mask = "1111111000000000"
         self._code = "0b1001000000000000"
+        self.cycles = 2
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
-
-        # Extract memory adress k
-        mem_k = ""
-        for x in range(5,8):
-            mem_k = mem_k + str(int(instr[x]))
-        for x in range(12,16):
-            mem_k = mem_k + str(int(instr[x]))
-        mem_k = mem_k[0] +  mem_k # Add 8 number
-        mem_k = int(mem_k, 2) # Convert to int
+    def decode(self, instr):
+        instr = int(instr)
+
+        # Extract memory adress k, bit 7 is a copy of bit 6
+        mem_k = ((instr >> 3) & 0x80) | ((instr >> 4) & 0x70) | (instr & 0xF)
 
         # Extract register Rd
-        reg_d = ""
-        for x in range(7,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) # Convert to int
+        reg = (instr >> 4) & 0x1F
 
+        return Decoded(self, d=reg, k=mem_k)
+
+    def execute_decoded(self, dec, state):
         # Assign the result to the register
-        state.data[mem_k] = state.data[reg_d]
+        state.data[dec.k] = state.data[dec.d]
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
 
 
 class Rjmp(InstRunner):
@@ -852,16 +852,20 @@ class Rjmp(InstRunner):
         self.name = "Rjmp"
         self._mask = "1111000000000000"
         self._code = "0b1100000000000000"
+        self.cycles = 2
 
-    def execute(self, instr, state):
-        # Extract k
-        k = ""
-        for x in range(4,16):
-            k = k + str(int(instr[x]))
-        k = int(k, 2) # Convert to int
+    def decode(self, instr):
+        # Extract k, in two's complement
+        k = int(instr) & 0xFFF
+        if k & 0x800:
+            k = k - 0x1000
 
+        return Decoded(self, k=k)
+
+    def execute_decoded(self, dec, state):
         # Increments PC by k + 1
-        state.pc = state.pc + k + 1
+        state.pc = state.pc + dec.k + 1
+        state.cycles = state.cycles + self.cycles
 
 
 class Brbs(InstRunner):
@@ -887,29 +891,30 @@ class Brbs(InstRunner):
         self.name = "Brbs"
         self._mask = "1111110000000000"
         self._code = "0b1111000000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
+    def decode(self, instr):
+        instr = int(instr)
 
         # Extract s
-        s = str(int(instr[6]))
-        for x in range(13,16):
-            s = s + str(int(instr[x]))
-        s = int(s, 2) # Convert to int
-
-        # Extract k
-        k = ""
-        for x in range(6,13):
-            k = k + str(int(instr[x]))
-        k = int(k, 2) # Convert to int
-        
+        s = instr & 0x7
+
+        # Extract k, in two's complement
+        k = (instr >> 3) & 0x7F
+        if k & 0x40:
+            k = k - 0x80
+
+        return Decoded(self, s=s, k=k)
+
+    def execute_decoded(self, dec, state):
         # Check if condition is true
-        if state.flags[s]:
-            state.pc = state.pc + k + 1
+        if state.flags[dec.s]:
+            state.pc = state.pc + dec.k + 1
+            state.cycles = state.cycles + self.cycles + 1 # Taken
         else:
             # Increments PC by 1
             state.pc = state.pc + 1
+            state.cycles = state.cycles + self.cycles
 
 
 class Brbc(InstRunner):
@@ -935,29 +940,30 @@ class Brbc(InstRunner):
         self.name = "Brbc"
         self._mask = "1111110000000000"
         self._code = "0b1111010000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
+    def decode(self, instr):
+        instr = int(instr)
 
         # Extract s
-        s = str(int(instr[6]))
-        for x in range(13,16):
-            s = s + str(int(instr[x]))
-        s = int(s, 2) # Convert to int
-
-        # Extract k
-        k = ""
-        for x in range(6,13):
-            k = k + str(int(instr[x]))
-        k = int(k, 2) # Convert to int
-        
+        s = instr & 0x7
+
+        # Extract k, in two's complement
+        k = (instr >> 3) & 0x7F
+        if k & 0x40:
+            k = k - 0x80
+
+        return Decoded(self, s=s, k=k)
+
+    def execute_decoded(self, dec, state):
         # Check if condition is true
-        if not state.flags[s]:
-            state.pc = state.pc + k + 1
+        if not state.flags[dec.s]:
+            state.pc = state.pc + dec.k + 1
+            state.cycles = state.cycles + self.cycles + 1 # Taken
         else:
             # Increments PC by 1
             state.pc = state.pc + 1
+            state.cycles = state.cycles + self.cycles
 
 
 class Nop(InstRunner):
@@ -981,10 +987,12 @@ class Nop(InstRunner):
         self.name = "Nop"
         self._mask = "1111111111111111"
         self._code = "0b0000000000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
+    def execute_decoded(self, dec, state):
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
 
 
 class Break(InstRunner):
@@ -1007,25 +1015,21 @@ class Break(InstRunner):
     """
     def __init__(self):
         self.name = "Break"
-        self._mask = ""
-        self._code = ""
-
-    def match(self, instr):
-        instr = int(instr)
-        if instr == 38296:
-            return True
-        else:
-            return False
+        self._mask = "1111111111111111"
+        self._code = "0b1001010110011000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
+    def execute_decoded(self, dec, state):
+        state.cycles = state.cycles + self.cycles
         raise BreakException
 
 
 class In(InstRunner):
     """
     Loads data from the I/O Space (Ports, Timers, Configuration
-    Registers, etc.) into register Rd in the Register File. When the
-    port is 0x0, reads a character of the keyboard.
+    Registers, etc.) into register Rd in the Register File. The port
+    is read by its handler on the bus of the state; by default, the
+    port 0x0 reads a character of the keyboard.
     
     Operation:
     Rd <= I/O (A)
@@ -1044,42 +1048,38 @@ class In(InstRunner):
         self.name = "In"
         self._mask = "1111100000000000"
         self._code = "0b1011000000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
-
-        # Extract Port A
-        port_a = ""
-        for x in range(6,7):
-            port_a = port_a + str(int(instr[x]))
-        for x in range(12,16):
-            port_a = port_a + str(int(instr[x]))
-        port_a = port_a[0] +  port_a  # Add 8 number
-        port_a = int(port_a, 2) # Convert to int
+    def decode(self, instr):
+        instr = int(instr)
+
+        # Extract Port A, bit 5 is a copy of bit 4
+        port_a = ((instr >> 4) & 0x20) | ((instr >> 5) & 0x10) | (instr & 0xF)
 
         # Extract register Rd
-        reg_d = ""
-        for x in range(7,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) # Convert to int
-
-        # Check if port_a is 0x0 
-        if port_a == 0:
-            result = input("Input to R{}: ".format(reg_d))
+        reg = (instr >> 4) & 0x1F
+
+        return Decoded(self, d=reg, A=port_a)
+
+    def execute_decoded(self, dec, state):
+        # Read the port through the handler bound on the bus
+        result = state.ports.read(dec.A, dec.d)
+        if result is not None:
             # Assign the result to the register
-            state.data[reg_d] = result
+            state.data[dec.d] = result
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
 
 
 class Out(InstRunner):
     """
     Stores data from register Rr in the Register File to I/O Space
-    (Ports, Timers, Configuration Registers, etc.). When the port is
-    0x0 the exit is on base 10. When the port ins 0x1 the exit is on
-    base 16. When the port is 0x2 the exit is UTF caracter.
+    (Ports, Timers, Configuration Registers, etc.). The port is
+    written by its handler on the bus of the state; by default, when
+    the port is 0x0 the exit is on base 10. When the port ins 0x1 the
+    exit is on base 16. When the port is 0x2 the exit is UTF caracter.
     
     Operation:
     I/O (A) <= Rr
@@ -1098,42 +1098,26 @@ class Out(InstRunner):
         self.name = "Out"
         self._mask = "1111100000000000"
         self._code = "0b1011100000000000"
+        self.cycles = 1
 
-    def execute(self, instr, state):
-        # Convert instr to bin
-        instr = bin(instr).replace("0b", "").zfill(16)
-
-        # Extract Port A
-        port_a = ""
-        for x in range(6,7):
-            port_a = port_a + str(int(instr[x]))
-        for x in range(12,16):
-            port_a = port_a + str(int(instr[x]))
-        port_a = port_a[0] +  port_a  # Add 8 number
-        port_a = int(port_a, 2) # Convert to int
+    def decode(self, instr):
+        instr = int(instr)
 
-        # Extract register Rd
-        reg_d = ""
-        for x in range(7,12):
-            reg_d = reg_d + str(int(instr[x]))
-        reg_d = int(reg_d, 2) # Convert to int
-
-        # Check if port_a is 0x0 
-        if port_a == 0:
-            # Extract result from register
-            result = int(state.data[reg_d])
-            # Print result
-            print "\nOutput from port {}: {}".format(hex(port_a), result)
-        elif port_a == 1:
-            # Extract result from register
-            result = state.data[reg_d]
-            # Print result
-            print "\nOutput from port {}: {}".format(hex(port_a), result)
-        elif port_a == 2:
-            # Extract result from register
-            result = unicode(str(state.data[reg_d]), "utf-8")
-            # Print result
-            print "\nOutput from port {}: {}".format(hex(port_a), result)
+        # Extract Port A, bit 5 is a copy of bit 4
+        port_a = ((instr >> 4) & 0x20) | ((instr >> 5) & 0x10) | (instr & 0xF)
+
+        # Extract register Rr
+        reg = (instr >> 4) & 0x1F
+
+        return Decoded(self, r=reg, A=port_a)
+
+    def execute_decoded(self, dec, state):
+        # Write the port through the handler bound on the bus, the
+        # register is only read if there is one
+        handler = state.ports[dec.A]
+        if handler is not None:
+            handler.write(dec.A, state.data[dec.r])
 
         # Increments PC by 1
         state.pc = state.pc + 1
+        state.cycles = state.cycles + self.cycles
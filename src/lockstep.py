@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("lockstep needs NumPy, install it with "
+                      "'pip install numpy'")
+
+from bitvec import Byte, Word
+from avrmcu import BREAK, BUDGET, UNKNOWN_CODE, OUT_OF_MEM
+from instruction import Add, Adc, Sub, Subi, And, Or, Eor, Lsr, Mov, Ldi, Sts, Lds, Rjmp, Brbs, Brbc, Nop, Break, In, Out
+
+IO = "io" # IN or OUT, that the lanes can not execute
+
+# States of a lane, and reasons of the stop of each one
+RUNNING, STOP_BREAK, STOP_UNKNOWN, STOP_OUT_OF_MEM, STOP_IO = range(5)
+REASONS = [BUDGET, BREAK, UNKNOWN_CODE, OUT_OF_MEM, IO]
+
+
+class LockstepResult(object):
+    """
+    Represents the end of a call to Lockstep.run.
+
+    :ivar steps: Instructions executed, adding all the lanes
+    :vartype steps: int
+    :ivar cycles: Cycles executed, adding all the lanes
+    :vartype cycles: int
+    :ivar seconds: Wall-clock time of the run
+    :vartype seconds: float
+    """
+    __slots__ = ('steps', 'cycles', 'seconds')
+
+    def __init__(self, steps, cycles, seconds):
+        self.steps = steps
+        self.cycles = cycles
+        self.seconds = seconds
+
+    def __repr__(self):
+        return "{0} lane-instructions in {1:.4f} s".format(self.steps,
+                                                           self.seconds)
+
+    def per_second(self):
+        """
+        Returns the lane-instructions executed per second.
+
+        :return: Lane-instructions per second
+        :rtype: float
+        """
+        if self.seconds <= 0:
+            return 0.0
+        return self.steps / self.seconds
+
+
+class Lockstep(object):
+    """
+    Simulates N instances of the program of an AvrMcu at the same
+    time. Every lane has its own data memory, PC, flags and counters,
+    kept as NumPy arrays, and all the lanes share the program.
+
+    On every step, the running lanes are grouped by PC and each group
+    executes its instruction as vector operations over the lanes of
+    the group, so when BRBS or BRBC make the lanes diverge, each
+    branch goes on as a smaller group. The semantics are the ones of
+    execute_decoded of every instruction, quirks included.
+
+    A lane stops on BREAK, on an unknown code, on an access out of
+    memory, or on IN or OUT, that need the console and are not run.
+
+    :param avrmcu: Simulator with the program and the initial state
+        of all the lanes
+    :type avrmcu: object from AvrMcu
+    :param n: Number of lanes
+    :type n: int
+    :ivar data: Data memory of every lane
+    :vartype data: numpy array of uint8, shape (n, size of data memory)
+    :ivar pc: Program Counter of every lane
+    :vartype pc: numpy array of int64
+    :ivar flags: Register status of every lane
+    :vartype flags: numpy array of uint8
+    :ivar cycles: Cycles executed by every lane
+    :vartype cycles: numpy array of int64
+    :ivar steps: Instructions executed by every lane
+    :vartype steps: numpy array of int64
+    :ivar stop: RUNNING, or why the lane stopped
+    :vartype stop: numpy array of int8
+    """
+    def __init__(self, avrmcu, n):
+        state = avrmcu._s
+        self._avrmcu = avrmcu
+        self._nprog = len(state.prog)
+        self._ndata = len(state.data)
+        self._cycles = state.cycles
+        self.n = n
+
+        row = np.array(list(state.data.get_raw()), dtype=np.uint8)
+        self.data = np.tile(row, (n, 1))
+        self.pc = np.full(n, int(state.pc), dtype=np.int64)
+        self.flags = np.full(n, int(state.flags) & 0xFF, dtype=np.uint8)
+        self.cycles = np.zeros(n, dtype=np.int64)
+        self.steps = np.zeros(n, dtype=np.int64)
+        self.stop = np.zeros(n, dtype=np.int8)
+
+        self._execute = {Add: self._add, Adc: self._add, Sub: self._sub,
+                         Subi: self._sub, And: self._logic, Or: self._logic,
+                         Eor: self._logic, Lsr: self._lsr, Mov: self._mov,
+                         Ldi: self._ldi, Sts: self._sts, Lds: self._lds,
+                         Nop: self._nop, Rjmp: self._rjmp,
+                         Brbs: self._branch, Brbc: self._branch,
+                         Break: self._break}
+
+    def run(self, max_steps):
+        """
+        Executes up to max_steps instructions on every running lane.
+
+        :param max_steps: Maximum instructions of every lane
+        :type max_steps: int
+
+        :return: Instructions and cycles of all the lanes, and time
+        :rtype: object from LockstepResult
+        """
+        steps, cycles = int(self.steps.sum()), int(self.cycles.sum())
+        start = time.time()
+        nsteps = 0
+        while nsteps < max_steps:
+            active = np.nonzero(self.stop == RUNNING)[0]
+            if len(active) == 0:
+                break
+            pcs = self.pc[active]
+            for pc in np.unique(pcs):
+                lanes = active[pcs == pc]
+                if len(lanes) == self.n:
+                    lanes = slice(None) # All the lanes, as a view
+                self._step(int(pc), lanes)
+            nsteps = nsteps + 1
+
+        return LockstepResult(int(self.steps.sum()) - steps,
+                              int(self.cycles.sum()) - cycles,
+                              time.time() - start)
+
+    def reasons(self):
+        """
+        Returns why every lane stopped, as the reasons of RunResult,
+        or IO. The lanes that are still running have BUDGET.
+
+        :return: Reasons
+        :rtype: list of str
+        """
+        return [REASONS[x] for x in self.stop]
+
+    def lane_state(self, i):
+        """
+        Builds the State of a lane, as a fork of the state of the
+        simulator with the memory and registers of the lane.
+
+        :param i: Number of the lane
+        :type i: int
+
+        :return: State of the lane
+        :rtype: object from State
+        """
+        state = self._avrmcu._s.fork()
+        state.data.set_raw(bytearray(self.data[i].tobytes()))
+        state.pc = Word(int(self.pc[i]))
+        state.flags = Byte(int(self.flags[i]))
+        state.cycles = self._cycles + int(self.cycles[i])
+        return state
+
+    def _step(self, pc, lanes):
+        """
+        Executes the instruction at address pc on some lanes.
+        """
+        if not 0 <= pc < self._nprog:
+            self.stop[lanes] = STOP_OUT_OF_MEM
+            return
+        dec = self._avrmcu._s.prog.get_decoded(pc)
+        if dec is None:
+            dec = self._avrmcu.decode(pc)
+
+        execute = self._execute.get(dec.runner.__class__)
+        if execute is None:
+            if dec.runner.__class__ in (In, Out):
+                self.stop[lanes] = STOP_IO
+            else:
+                self.stop[lanes] = STOP_UNKNOWN
+        elif not execute(dec, pc, lanes):
+            self.stop[lanes] = STOP_OUT_OF_MEM
+        else:
+            self.steps[lanes] += 1
+            self.cycles[lanes] += dec.runner.cycles
+
+    def _fits(self, *addrs):
+        """
+        Checks that some addresses are inside data memory.
+        """
+        return all(0 <= x < self._ndata for x in addrs)
+
+    def _set_flags(self, lanes, c=None, z=None, n=None):
+        """
+        Sets the flags given on some lanes.
+        """
+        f = self.flags[lanes]
+        for value, bit in ((c, 7), (z, 6), (n, 5)):
+            if value is not None:
+                f = ((f & (0xFF & ~(1 << bit))) |
+                     (np.asarray(value, dtype=np.uint8) << bit))
+        self.flags[lanes] = f
+
+    def _add(self, dec, pc, lanes):
+        # Result on r, C set and 255 subtracted above 255
+        if not self._fits(dec.d, dec.r):
+            return False
+        t = (self.data[lanes, dec.r].astype(np.int16) +
+             self.data[lanes, dec.d])
+        if dec.runner.__class__ is Adc:
+            t = t + ((self.flags[lanes] >> 7) & 1)
+        c = t > 255
+        t = np.where(c, t - 255, t)
+        self.data[lanes, dec.r] = t
+        self._set_flags(lanes, c=c, z=(t == 0), n=False)
+        self.pc[lanes] = pc + 1
+        return True
+
+    def _sub(self, dec, pc, lanes):
+        # C set and 255 subtracted from 255 on, N of the unmasked result
+        if not self._fits(dec.d) or (dec.r is not None and
+                                     not self._fits(dec.r)):
+            return False
+        t = self.data[lanes, dec.d].astype(np.int16)
+        if dec.runner.__class__ is Subi:
+            t = t - dec.K
+        else:
+            t = t - self.data[lanes, dec.r]
+        c = t >= 255
+        t = np.where(c, t - 255, t)
+        self.data[lanes, dec.d] = t & 0xFF
+        self._set_flags(lanes, c=c, z=(t == 0), n=(t < 0))
+        self.pc[lanes] = pc + 1
+        return True
+
+    def _logic(self, dec, pc, lanes):
+        if not self._fits(dec.d, dec.r):
+            return False
+        d, r = self.data[lanes, dec.d], self.data[lanes, dec.r]
+        cls = dec.runner.__class__
+        if cls is And:
+            t = d & r
+        elif cls is Or:
+            t = d | r
+        else:
+            t = d ^ r
+        self.data[lanes, dec.d] = t
+        self._set_flags(lanes, z=(t == 0), n=False)
+        self.pc[lanes] = pc + 1
+        return True
+
+    def _lsr(self, dec, pc, lanes):
+        # C from bit 7, rotated as a Byte and bit 0 cleared
+        if not self._fits(dec.d):
+            return False
+        d = self.data[lanes, dec.d].astype(np.int16)
+        t = ((d >> 1) | (d << 7)) & 0xFE
+        self.data[lanes, dec.d] = t
+        self._set_flags(lanes, c=(d >> 7), z=(t == 0), n=False)
+        self.pc[lanes] = pc + 1
+        return True
+
+    def _mov(self, dec, pc, lanes):
+        if not self._fits(dec.d, dec.r):
+            return False
+        self.data[lanes, dec.d] = self.data[lanes, dec.r]
+        self.pc[lanes] = pc + 1
+        return True
+
+    def _ldi(self, dec, pc, lanes):
+        if not self._fits(dec.d):
+            return False
+        self.data[lanes, dec.d] = dec.K
+        self.pc[lanes] = pc + 1
+        return True
+
+    def _sts(self, dec, pc, lanes):
+        # (k) <= Rr
+        if not self._fits(dec.k, dec.r):
+            return False
+        self.data[lanes, dec.k] = self.data[lanes, dec.r]
+        self.pc[lanes] = pc + 1
+        return True
+
+    def _lds(self, dec, pc, lanes):
+        # (k) <= Rd, as Lds.execute_decoded does
+        if not self._fits(dec.k, dec.d):
+            return False
+        self.data[lanes, dec.k] = self.data[lanes, dec.d]
+        self.pc[lanes] = pc + 1
+        return True
+
+    def _nop(self, dec, pc, lanes):
+        self.pc[lanes] = pc + 1
+        return True
+
+    def _rjmp(self, dec, pc, lanes):
+        self.pc[lanes] = pc + dec.k + 1
+        return True
+
+    def _branch(self, dec, pc, lanes):
+        # Taken branches have one more cycle
+        bit = (self.flags[lanes] >> (7 - dec.s)) & 1
+        if dec.runner.__class__ is Brbs:
+            taken = bit == 1
+        else:
+            taken = bit == 0
+        self.pc[lanes] = np.where(taken, pc + dec.k + 1, pc + 1)
+        self.cycles[lanes] += taken
+        return True
+
+    def _break(self, dec, pc, lanes):
+        # PC stays on BREAK, that counts as executed
+        self.stop[lanes] = STOP_BREAK
+        return True
@@ -1,56 +1,364 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import sys
+import binascii
+from array import array
+
 from bitvec import Byte, Word
 from avrexcep import OutOfMemError
 
-from bitvec import Word, Byte
+PAGE_SHIFT = 4 # Bits of the address of a cell inside its page
+PAGE_SIZE = 1 << PAGE_SHIFT # Cells of a page, copied on write by forks
+PAGE_MASK = PAGE_SIZE - 1
+READ, WRITE = 0, 1 # Kinds of access of the trace, as in memtrace
+ON_READ, ON_WRITE, ON_CHANGE = 1, 2, 4 # Kinds of watchpoint, as bits
+
+# Formats of write_dump: lines of dump, rows of hex digits and raw bytes
+TEXT, HEX, BINARY = "text", "hex", "binary"
+ROW = 16 # Cells of a row of HEX
+CHUNK = 1024 # Lines joined in every write to the file
+
+
+def cell_text(value):
+    """
+    Represents the content of a cell as the repr of Byte and Word: hex
+    digits, with a 0 before when there are less than decimal digits.
+
+    :param value: Content of the cell
+    :type value: int
+
+    :return: Representation
+    :rtype: str
+    """
+    digits = "{0:X}".format(value)
+    if len(digits) != len(str(value)):
+        digits = "0" + digits
+    return digits
+
+
+_BYTE_TEXT = [cell_text(x) for x in range(256)] # cell_text of every Byte
+
+class Pages(object):
+    """
+    Buffer of a forked bank of memory, split in pages of PAGE_SIZE
+    cells. It is read and written as the flat buffer of a bank, a
+    bytearray or an array('H'), so the code that runs the programs
+    works on both.
+
+    The pages are shared with the other forks until written: the first
+    write of a bank to a page copies that page alone, and marks it on
+    the dirty bitmap. So the dirty pages are the ones written since
+    the fork, and the pages that two forks still share are the same
+    object on both page tables.
+
+    :param pages: Page table, with the last page shorter if needed
+    :type pages: list of bytearray or of array
+    """
+    __slots__ = ('_pages', '_dirty', '_len')
+
+    def __init__(self, pages):
+        self._pages = pages
+        self._dirty = bytearray(len(pages)) # 1 where the page is own
+        self._len = sum(len(x) for x in pages)
+
+    @classmethod
+    def split(cls, buf):
+        """
+        Builds the pages of a flat buffer.
+
+        :param buf: Flat buffer
+        :type buf: bytearray or array
+
+        :return: Paged buffer with the content of buf
+        :rtype: object from Pages
+        """
+        return cls([buf[x:x + PAGE_SIZE] for x in range(0, len(buf),
+                                                         PAGE_SIZE)])
+
+    def fork(self):
+        """
+        Builds a buffer that shares all the pages with this one, and
+        takes them as shared on this one too.
+
+        :return: Fork of the buffer
+        :rtype: object from Pages
+        """
+        self._dirty = bytearray(len(self._pages))
+        return Pages(self._pages[:])
+
+    def dirty_pages(self):
+        """
+        Returns the pages written since the fork.
+
+        :return: Numbers of the pages
+        :rtype: list of int
+        """
+        dirty = self._dirty
+        return [x for x in range(len(dirty)) if dirty[x]]
+
+    def flat(self):
+        """
+        Returns a copy of the content as a flat buffer.
+
+        :return: Content
+        :rtype: bytearray or array
+        """
+        buf = self._pages[0][:0]
+        for page in self._pages:
+            buf.extend(page)
+        return buf
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for page in self._pages:
+            for x in page:
+                yield x
+
+    def __eq__(self, other):
+        if isinstance(other, Pages):
+            other = other.flat()
+        return self.flat() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __getitem__(self, addr):
+        if isinstance(addr, slice):
+            return self.flat()[addr]
+        return self._pages[addr >> PAGE_SHIFT][addr & PAGE_MASK]
+
+    def __setitem__(self, addr, val):
+        if isinstance(addr, slice):
+            self._set_slice(addr, val)
+            return
+        page = addr >> PAGE_SHIFT
+        if not self._dirty[page]:
+            self._pages[page] = self._pages[page][:]
+            self._dirty[page] = 1
+        self._pages[page][addr & PAGE_MASK] = val
+
+    def _set_slice(self, addrs, values):
+        """
+        Writes an interval of cells. Only the pages whose content
+        changes are copied and marked as dirty.
+        """
+        f, t, step = addrs.indices(self._len)
+        if step != 1 or len(values) != t - f:
+            raise ValueError("Only intervals of the same size are written")
+        pages = self._pages
+        for page in range(f >> PAGE_SHIFT, (t + PAGE_MASK) >> PAGE_SHIFT):
+            lo = page << PAGE_SHIFT
+            a, b = max(f, lo), min(t, lo + PAGE_SIZE)
+            new = values[a - f:b - f]
+            if pages[page][a - lo:b - lo] == new:
+                continue
+            if not self._dirty[page]:
+                pages[page] = pages[page][:]
+                self._dirty[page] = 1
+            pages[page][a - lo:b - lo] = new
+
+
+class Cells(object):
+    """
+    Object view over the buffer of a memory bank. The cells are read
+    as new objects of Byte or Word, and can be written with objects of
+    BitVector or with ints, that are truncated to the width of the
+    cell.
+
+    :param memory: Memory bank
+    :type memory: object from Memory
+    :param on_write: Called with the address of every write, or None
+    :type on_write: function
+    """
+    __slots__ = ('_memory', '_on_write')
+
+    def __init__(self, memory, on_write=None):
+        self._memory = memory
+        self._on_write = on_write
+
+    def __len__(self):
+        return len(self._memory._buf)
+
+    def __iter__(self):
+        cell = self._memory._cell
+        for x in self._memory._buf:
+            yield cell(x)
+
+    def __getitem__(self, addr):
+        return self._memory._cell(self._memory._buf[addr])
+
+    def __setitem__(self, addr, val):
+        memory = self._memory
+        memory._buf[addr] = int(val) & memory._ones
+        if self._on_write is not None:
+            self._on_write(addr)
+
 
 class Memory(object):
     """
-    Represents a memory bank. 
+    Represents a memory bank. The content is stored in a flat buffer,
+    a bytearray for Bytes and an array('H') for Words, and _m is an
+    object view of it for the code that works with cells.
+
+    A fork of a bank shares the pages of the buffer with it: both
+    buffers become Pages, and each page is copied by the first bank
+    that writes on it. The banks that have never been forked keep the
+    flat buffer, so they do not pay for the page table.
 
+    :ivar _buf: Buffer of the bank of memory
+    :vartype _buf: bytearray, array or object from Pages
     :ivar _m: Bank of memory
-    :vartype _m: list
+    :vartype _m: object from Cells
     :ivar _trace: Trace activated or deactivated
     :vartype _trace: bool
+    :ivar _recorder: Recorder of the trace, or None
+    :vartype _recorder: object from memtrace.TraceRecorder
+    :ivar _watch: Kinds of watchpoint of every address, or None if
+        there are no watchpoints armed
+    :vartype _watch: bytearray
+    :ivar _watcher: Called on the accesses to the watched addresses
+    :vartype _watcher: object from breakpoints.Breakpoints
 
     """
+    _cell = Byte # Class of the cells
+    _ones = 0xFF # Mask with all the bits of a cell
+    _recorder = None
+    _watch = None
+    _watcher = None
+
     def __init__(self):
-        self._m = [] # In subclasses will be an object of Word or Byte
+        self._buf = bytearray()
+        self._m = Cells(self)
         self._trace = False
 
-    def trace_on(self):
+    def trace_on(self, recorder=None):
         """
-        Activates the trace
+        Activates the trace. The reads and writes are recorded by the
+        recorder given, or by a new one with the default ring.
+
+        :param recorder: Recorder of the trace
+        :type recorder: object from memtrace.TraceRecorder
         """
+        if recorder is None:
+            from memtrace import TraceRecorder
+            recorder = TraceRecorder()
+        self._recorder = recorder
         self._trace = True
 
     def trace_off(self):
         """
-        Deactivates the trace
+        Deactivates the trace. The recorder keeps the records.
         """
         self._trace = False
 
     def __len__(self):
-        return len(self._m)
+        return len(self._buf)
+
+    def clear(self):
+        """
+        Sets all the cells to 0, without building a new bank.
+        """
+        self.set_raw(self._new_buffer(len(self._buf)))
+
+    def get_raw(self):
+        """
+        Returns a copy of the buffer of the bank of memory.
+
+        :return: Content of the memory
+        :rtype: bytearray or array
+        """
+        return self._buf[:]
+
+    def set_raw(self, raw):
+        """
+        Copies the content of a buffer, as the one returned by
+        get_raw, to the bank of memory.
+
+        :param raw: Content of the memory
+        :type raw: bytearray or array
+        """
+        if len(raw) != len(self._buf):
+            raise OutOfMemError
+        self._buf[:] = raw
+
+    def fork(self):
+        """
+        Builds a bank that shares the pages of the buffer with this
+        one. Each page is copied by the first bank that writes on it.
+
+        :return: Fork of the bank
+        :rtype: object from the class of self
+        """
+        if not isinstance(self._buf, Pages):
+            self._buf = Pages.split(self._buf)
+        child = object.__new__(self.__class__)
+        child.__dict__.update(self.__dict__)
+        child._m = Cells(child)
+        child._buf = self._buf.fork()
+        return child
+
+    def dirty_pages(self):
+        """
+        Returns the pages written since the bank was forked, or since
+        it was last forked from. A bank that has never been forked has
+        no dirty pages.
+
+        :return: Numbers of the pages, a page has PAGE_SIZE cells
+        :rtype: list of int
+        """
+        if not isinstance(self._buf, Pages):
+            return []
+        return self._buf.dirty_pages()
+
+    def _diff_pages(self, other):
+        """
+        Returns the pages that can differ from the buffer other: the
+        ones that are not shared, or all if one buffer is flat.
+        """
+        buf = self._buf
+        npages = (len(buf) + PAGE_SIZE - 1) // PAGE_SIZE
+        if isinstance(buf, Pages) and isinstance(other, Pages):
+            mine, theirs = buf._pages, other._pages
+            return [x for x in range(npages) if mine[x] is not theirs[x]]
+        return range(npages)
+
+    def diff(self, other):
+        """
+        Compares the content with another bank, page by page, and
+        returns the cells that differ. The pages that the banks still
+        share are not read.
+
+        :param other: Bank of the same size
+        :type other: object from Memory
+
+        :return: Address, own content and content of other of each cell
+            that differs
+        :rtype: list of tuples
+        """
+        if len(other) != len(self):
+            raise OutOfMemError
+        buf, obuf = self._buf, other._buf
+        result = []
+        for page in self._diff_pages(obuf):
+            for x in range(page * PAGE_SIZE, min((page + 1) * PAGE_SIZE,
+                                                 len(buf))):
+                if buf[x] != obuf[x]:
+                    result.append((x, buf[x], obuf[x]))
+        return result
+
+    def _new_buffer(self, ncells):
+        """
+        Builds a buffer of ncells cells set to 0.
+        """
+        return bytearray(ncells)
 
     def __repr__(self):
-        if len(self._m[0]) == 8: # Byte
-            result = ""
-            for x in range(len(self._m)):
-                hex_dir = hex(x).zfill(4).upper() # Memory direction
-                hex_con = str(self._m[x]).zfill(2).upper() # Memory content
-                result = result + "{0}: {1}\n".format(hex_dir, hex_con)
-            return result
-        else: # Word
-            result = ""
-            for x in range(len(self._m)):
-                hex_dir = hex(x).zfill(4).upper() # Memory direction
-                hex_con = str(self._m[x]).zfill(4).upper() # Memory content
-                result = result + "{0}: {1}\n".format(hex_dir, hex_con)
-            return result
-        
+        width = 2 if self._cell is Byte else 4
+        return "".join(self.iter_dump(width=width))
+
     def dump(self, f=0, t=5):
         """
         Check stored data of an interval.
@@ -63,68 +371,311 @@ class Memory(object):
         :return: Stored data
         :rtype: str
         """
-        if len(self._m[0]) == 8: # Byte
-            result = ""
-            for x in range(f,t):
-                hex_dir = hex(x).zfill(4).upper() # Memory direction
-                hex_con = str(self._m[x]).zfill(4).upper() # Memory content
-                result = result + "{0}: {1}\n".format(hex_dir, hex_con)
-            return result
-        else: # Word
-            result = ""
-            for x in range(f,t):
-                hex_dir = hex(x).zfill(4).upper() # Memory direction
-                hex_con = str(self._m[x]).zfill(4).upper() # Memory content
-                result = result + "{0}: {1}\n".format(hex_dir, hex_con)
-            return result
-            
+        return "".join(self.iter_dump(f, t))
+
+    def iter_dump(self, f=0, t=None, width=4):
+        """
+        Represents the cells of an interval line by line, like this:
+
+        0X12C: 00C8
+
+        :param f: Left of interval
+        :type f: int
+        :param t: Right of interval, the end of the bank if None
+        :type t: int
+        :param width: Minimum digits of the content
+        :type width: int
+
+        :return: Lines
+        :rtype: generator of str
+        """
+        t = len(self._buf) if t is None else t
+        if not 0 <= f <= t <= len(self._buf):
+            hex_dir = hex(t).zfill(4).upper() # Memory direction
+            raise OutOfMemError("Read from {0} out of range".format(hex_dir))
+        text = _BYTE_TEXT if self._cell is Byte else None
+        for x, value in enumerate(self._buf[f:t], f):
+            hex_dir = hex(x).zfill(4).upper() # Memory direction
+            hex_con = text[value] if text else cell_text(value) # Content
+            yield "{0}: {1}\n".format(hex_dir, hex_con.zfill(width))
+
+    def write_dump(self, out, f=0, t=None, fmt=TEXT):
+        """
+        Writes the cells of an interval to a file, in chunks. The
+        format is one of:
+
+        TEXT: the lines of dump
+        HEX: ROW cells per line, as hex digits after the address, like
+        0010: 00c80000000000000000000000000000
+        BINARY: the raw cells, Words as little endian
+
+        :param out: File where the dump is written
+        :type out: file
+        :param f: Left of interval
+        :type f: int
+        :param t: Right of interval, the end of the bank if None
+        :type t: int
+        :param fmt: Format, TEXT, HEX or BINARY
+        :type fmt: str
+        """
+        t = len(self._buf) if t is None else t
+        if fmt == TEXT:
+            lines = []
+            for line in self.iter_dump(f, t):
+                lines.append(line)
+                if len(lines) == CHUNK:
+                    out.write("".join(lines))
+                    lines = []
+            out.write("".join(lines))
+        elif fmt == HEX:
+            lines = []
+            for x in range(f, t, ROW):
+                lines.append("{0:04x}: {1}\n".format(x, binascii.hexlify(
+                             self._raw_bytes(x, min(x + ROW, t)))))
+                if len(lines) == CHUNK:
+                    out.write("".join(lines))
+                    lines = []
+            out.write("".join(lines))
+        else:
+            for x in range(f, t, CHUNK * ROW):
+                out.write(self._raw_bytes(x, min(x + CHUNK * ROW, t),
+                                          big=False))
+
+    def _raw_bytes(self, f, t, big=True):
+        """
+        Returns the cells of an interval as bytes, Words as big endian,
+        or as little endian if big is False.
+        """
+        if self._cell is Byte:
+            return bytes(self._buf[f:t])
+        words = self._buf[f:t]
+        if big == (sys.byteorder == "little"):
+            words.byteswap()
+        return words.tostring()
+
     def __getitem__(self, addr):
         addr = int(addr)
-        if addr < len(self._m):
+        if 0 <= addr < len(self._buf):
             if self._trace:
-                hex_dir = hex(addr).zfill(4).upper() # Memory direction
-                hex_con = self._m[addr] # Memory content
-                print "Read {0} from {1}".format(hex_con, hex_dir)
-            return self._m[addr]
+                recorder = self._recorder
+                if recorder.lo <= addr < recorder.hi:
+                    recorder.record(READ, addr, self._buf[addr])
+            watch = self._watch
+            if watch is not None and watch[addr] & ON_READ:
+                self._watcher.read(addr, self._buf[addr])
+            return self._cell(self._buf[addr])
         else:
             hex_dir = hex(addr).zfill(4).upper() # Memory direction
-            print "Read from {0} out of range".format(hex_dir)
-            error = OutOfMemError()
+            raise OutOfMemError("Read from {0} out of range".format(hex_dir))
         
     def __setitem__(self, addr, val):
         addr = int(addr)
-        if addr < len(self._m):
-            if self._trace:
-                hex_dir = hex(addr).zfill(4).upper() # Memory direction
-                hex_con = str(val) # Memory content
-                print "Write {0} to {1}".format(hex_con, hex_dir)
+        if 0 <= addr < len(self._buf):
+            watch = self._watch
+            old = self._buf[addr]
                 
-            if type(val) is int: # Cheks if val is a int
-                my_word = Word(val)
-                self._m[addr] = my_word
-            else:
-                self._m[addr] = val
+            # Ints and BitVectors are stored truncated to the cell
+            self._buf[addr] = int(val) & self._ones
+
+            if watch is not None and watch[addr] & (ON_WRITE | ON_CHANGE):
+                self._watcher.write(addr, old, self._buf[addr])
+
+            if self._trace:
+                recorder = self._recorder
+                if recorder.lo <= addr < recorder.hi:
+                    recorder.record(WRITE, addr, self._buf[addr])
         else:
-             hex_dir = hex(addr).zfill(4).upper() # Memory direction
-             print "Write to {0} out of range".format(hex_dir)
-             error = OutOfMemError()
+            hex_dir = hex(addr).zfill(4).upper() # Memory direction
+            raise OutOfMemError("Write to {0} out of range".format(hex_dir))
 
 class ProgramMemory(Memory):
     """
     Represents a bank of memory for store data. The stored data are
     Bytes.
 
+    Keeps a cache with the decoded instruction of every cell, that
+    is filled by the simulator and cleared when the cell is written.
+    A fork shares the caches until the first write to its program.
+    The compiled blocks, the fused sequences and whether an idle loop
+    can start at every cell are kept the same way, and a write clears
+    the ones that span the cell written.
+
     :param ncells: Number of cells
     :type ncells: int
+    :ivar _decoded: Decoded instruction of each cell, or None
+    :vartype _decoded: list
+    :ivar _blocks: Compiled block that starts at each cell, or None
+    :vartype _blocks: list
+    :ivar _fused: Fused sequence that starts at each cell, or None
+    :vartype _fused: list
+    :ivar _idle: If an idle loop can start at each cell, with the
+        interval of cells read to know it, or None
+    :vartype _idle: list of tuples
     """
+    _cell = Word
+    _ones = 0xFFFF
+    _shared = False # The caches are shared with forks
+
     def __init__(self, ncells=1024):
         self._trace = False
         
-        memory_bank = []
-        for x in range(ncells):
-            my_word = Word()
-            memory_bank.append(my_word)
-        self._m = memory_bank
+        self._buf = self._new_buffer(ncells)
+        self._m = Cells(self, self._invalidate_cell)
+        self._decoded = [None] * ncells
+        self._blocks = [None] * ncells
+        self._fused = [None] * ncells
+        self._idle = [None] * ncells
+        self._span = 1 # Most cells of a block or a fused sequence
+
+    def _new_buffer(self, ncells):
+        return array('H', [0]) * ncells
+
+    def load(self, words, f=0):
+        """
+        Writes a sequence of words from cell f with a single copy to
+        the buffer, and clears the decoded cells that changed.
+
+        :param words: Words to write
+        :type words: array('H')
+        :param f: First cell
+        :type f: int
+        """
+        t = f + len(words)
+        if f < 0 or t > len(self._buf):
+            raise OutOfMemError
+        self._buf[f:t] = words
+        self.invalidate(f, t)
+
+    def _invalidate_cell(self, addr):
+        self.invalidate(addr, addr + 1)
+
+    def fork(self):
+        child = Memory.fork(self)
+        child._m = Cells(child, child._invalidate_cell)
+        child._shared = self._shared = True
+        return child
+
+    def _own(self):
+        """
+        Copies the caches shared with forks before the first change.
+        """
+        self._shared = False
+        self._decoded = self._decoded[:]
+        self._blocks = self._blocks[:]
+        self._fused = self._fused[:]
+        self._idle = self._idle[:]
+
+    def __setitem__(self, addr, val):
+        Memory.__setitem__(self, addr, val)
+        addr = int(addr)
+        self.invalidate(addr, addr + 1)
+
+    def get_decoded(self, addr):
+        """
+        Returns the decoded instruction of a cell, or None if it has
+        not been decoded since the last write.
+
+        :param addr: Address of the cell
+        :type addr: int
+
+        :return: Decoded instruction
+        :rtype: object from Decoded
+        """
+        return self._decoded[int(addr)]
+
+    def set_decoded(self, addr, dec):
+        """
+        Stores the decoded instruction of a cell.
+
+        :param addr: Address of the cell
+        :type addr: int
+        :param dec: Decoded instruction
+        :type dec: object from Decoded
+        """
+        self._decoded[int(addr)] = dec
+
+    def get_block(self, addr):
+        """
+        Returns the compiled block that starts at a cell, or None if
+        it has not been compiled since the last write.
+
+        :param addr: Address of the cell
+        :type addr: int
+
+        :return: Compiled block
+        :rtype: object from compiler.Block
+        """
+        return self._blocks[int(addr)]
+
+    def set_block(self, addr, block):
+        """
+        Stores the compiled block that starts at a cell.
+
+        :param addr: Address of the cell
+        :type addr: int
+        :param block: Compiled block
+        :type block: object from compiler.Block
+        """
+        self._blocks[int(addr)] = block
+        self._span = max(self._span, block.steps)
+
+    def get_fused(self, addr):
+        """
+        Returns the fused sequence that starts at a cell, or None if
+        it has not been looked for since the last write.
+
+        :param addr: Address of the cell
+        :type addr: int
+
+        :return: Fused sequence
+        :rtype: object from fusion.Fused
+        """
+        return self._fused[int(addr)]
+
+    def set_fused(self, addr, fused):
+        """
+        Stores the fused sequence that starts at a cell.
+
+        :param addr: Address of the cell
+        :type addr: int
+        :param fused: Fused sequence
+        :type fused: object from fusion.Fused
+        """
+        self._fused[int(addr)] = fused
+        self._span = max(self._span, fused.steps)
+
+    def invalidate(self, f=0, t=None):
+        """
+        Clears the decoded instructions of an interval, and the
+        compiled blocks, fused sequences and idle loops that span any
+        cell of it.
+
+        :param f: Left of interval
+        :type f: int
+        :param t: Right of interval, the end of memory if None
+        :type t: int
+        """
+        t = len(self._decoded) if t is None else t
+        if f >= t:
+            return
+        if self._shared:
+            self._own()
+        self._decoded[f:t] = [None] * (t - f)
+        for cache in (self._blocks, self._fused):
+            for x in range(max(0, f - self._span + 1), t):
+                entry = cache[x]
+                if entry is not None and x + max(entry.steps, 1) > f:
+                    cache[x] = None
+        idle = self._idle
+        for x, entry in enumerate(idle):
+            if entry is not None and entry[1] < t and entry[2] > f:
+                idle[x] = None
+
+    def set_raw(self, raw):
+        if len(raw) == len(self._buf) and self._buf == raw:
+            return # Same program, the decoded cells are still valid
+        Memory.set_raw(self, raw)
+        self.invalidate()
 
 
 class DataMemory(Memory):
@@ -139,11 +690,8 @@ class DataMemory(Memory):
         self._trace = False
         
         ncell = ncells if ncells>32 else 32
-        memory_bank = []
-        for x in range(ncells):
-            my_byte = Byte()
-            memory_bank.append(my_byte)
-        self._m = memory_bank
+        self._buf = self._new_buffer(ncells)
+        self._m = Cells(self)
 
     def dump_reg(self):
         """
@@ -161,20 +709,23 @@ class DataMemory(Memory):
         :return: Registers
         :rtype: str
         """
-        register = ""
-        for x in range(32): # Adding registers from 00 to 31
-            reg_num = str(x).zfill(2)
-            hex_con = str(self._m[x]).zfill(2).upper() # Memory content
-            register = register + "R{0}: {1}\n".format(reg_num, hex_con)
+        return "".join(self.iter_reg())
 
-        reg_x = self._m[27] + self._m[26]
-        register = register + "X(R27:R26): {0}\n".format(str(reg_x).zfill(4)) # Adding X
-        reg_y = self._m[29] + self._m[28]
-        register = register + "Y(R29:R28): {0}\n".format(str(reg_y).zfill(4)) # Adding Y
-        reg_z = self._m[31] + self._m[30]
-        register = register + "Z(R31:R30): {0}".format(str(reg_z).zfill(4)) # Adding Z
+    def iter_reg(self):
+        """
+        Represents the registers line by line, as dump_reg.
+
+        :return: Lines, the last one without newline
+        :rtype: generator of str
+        """
+        m = self._buf
+        for x in range(32): # Registers from 00 to 31
+            yield "R{0:02d}: {1}\n".format(x, _BYTE_TEXT[m[x]].zfill(2))
 
-        return register
+        # X, Y and Z as the addition of their Bytes
+        yield "X(R27:R26): {0}\n".format(cell_text(m[27] + m[26]).zfill(4))
+        yield "Y(R29:R28): {0}\n".format(cell_text(m[29] + m[28]).zfill(4))
+        yield "Z(R31:R30): {0}".format(cell_text(m[31] + m[30]).zfill(4))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import struct
+
+from bitvec import Byte
+
+READ, WRITE = 0, 1 # Kinds of access
+
+# Binary record: step, PC, address, value and kind of access
+RECORD = struct.Struct("<QHHHB")
+
+
+class TraceRecorder(object):
+    """
+    Records the accesses to a bank of memory in a ring buffer of
+    fixed size, as binary records of RECORD. When the ring is full,
+    the oldest records are overwritten, or written to the file if
+    there is one, so no record is lost.
+
+    Only the addresses from lo to hi are recorded. The step and the PC
+    of every record are kept by the instrumented loop that AvrMcu.run
+    uses when the trace of data memory is on.
+
+    :param size: Records of the ring
+    :type size: int
+    :param f: Binary file where the records are streamed, or None
+    :type f: file
+    :param lo: First address recorded
+    :type lo: int
+    :param hi: Address after the last one recorded, no limit if None
+    :type hi: int
+    :ivar step: Instructions executed since the recorder was built
+    :vartype step: int
+    :ivar pc: Address of the instruction in execution
+    :vartype pc: int
+    :ivar dropped: Records overwritten without being drained
+    :vartype dropped: int
+    """
+    def __init__(self, size=65536, f=None, lo=0, hi=None):
+        self.lo = lo
+        self.hi = 0x10000 if hi is None else hi
+        self.step = 0
+        self.pc = 0
+        self.dropped = 0
+        self._f = f
+        self._size = size
+        self._ring = bytearray(size * RECORD.size)
+        self._next = 0 # Record to write
+        self._count = 0 # Records in the ring
+
+    def __len__(self):
+        return self._count
+
+    def record(self, kind, addr, value):
+        """
+        Adds a record to the ring.
+
+        :param kind: READ or WRITE
+        :type kind: int
+        :param addr: Address of the access
+        :type addr: int
+        :param value: Content read or written
+        :type value: int
+        """
+        RECORD.pack_into(self._ring, self._next * RECORD.size, self.step,
+                         self.pc & 0xFFFF, addr, value, kind)
+        self._next = self._next + 1
+        if self._count < self._size:
+            self._count = self._count + 1
+        else:
+            self.dropped = self.dropped + 1
+        if self._next == self._size:
+            self._next = 0
+            if self._f is not None:
+                self.flush()
+
+    def _raw(self):
+        """
+        Returns the records of the ring, from the oldest, as bytes.
+        """
+        end = self._next * RECORD.size
+        start = end - self._count * RECORD.size
+        if start >= 0:
+            return bytes(self._ring[start:end])
+        return bytes(self._ring[start:] + self._ring[:end])
+
+    def _clear(self):
+        self._next = 0
+        self._count = 0
+
+    def drain(self):
+        """
+        Takes the records of the ring, from the oldest, and empties it.
+
+        :return: Records as tuples of step, pc, address, value and kind
+        :rtype: list of tuples
+        """
+        records = list(decode(self._raw()))
+        self._clear()
+        return records
+
+    def flush(self):
+        """
+        Writes the records of the ring to the file, and empties it.
+        Without a file it does nothing, and the records are kept for
+        drain.
+        """
+        if self._f is None:
+            return
+        self._f.write(self._raw())
+        self._f.flush()
+        self._clear()
+
+
+def decode(raw):
+    """
+    Decodes binary records of RECORD.
+
+    :param raw: Records
+    :type raw: str
+
+    :return: Records as tuples of step, pc, address, value and kind
+    :rtype: generator of tuples
+    """
+    for x in range(0, len(raw) - RECORD.size + 1, RECORD.size):
+        yield RECORD.unpack_from(raw, x)
+
+
+def read_trace(path):
+    """
+    Reads the records of a file streamed by a TraceRecorder.
+
+    :param path: Path to the file
+    :type path: str
+
+    :return: Records as tuples of step, pc, address, value and kind
+    :rtype: list of tuples
+    """
+    with open(path, "rb") as f:
+        return list(decode(f.read()))
+
+
+def render(records, cell=Byte):
+    """
+    Represents records like the old trace of Memory:
+
+    Read 0A from 0X11
+    Write 0B to 0X12
+
+    :param records: Records as tuples of step, pc, address, value and
+        kind
+    :type records: iterable of tuples
+    :param cell: Class of the cells of the memory
+    :type cell: class
+
+    :return: Representation
+    :rtype: str
+    """
+    lines = []
+    for step, pc, addr, value, kind in records:
+        hex_dir = hex(addr).zfill(4).upper() # Memory direction
+        if kind == READ:
+            lines.append("Read {0} from {1}".format(cell(value), hex_dir))
+        else:
+            lines.append("Write {0} to {1}".format(cell(value), hex_dir))
+    return "".join(x + "\n" for x in lines)
@@ -0,0 +1,538 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import struct
+import threading
+from array import array
+from collections import deque
+
+from avrexcep import ReplayError
+
+NPORTS = 64 # Addresses of the I/O space
+CONSOLE_PORTS = (0, 1, 2) # Ports bound to the console by default
+
+# Binary record of an input: cycles of the state, port and value read
+INPUT_RECORD = struct.Struct("<QBB")
+NO_VALUE = 0x80 # Or of the port of the reads that returned None
+
+
+def output_text(port, value):
+    """
+    Represents a write on a port as the console prints it: the port 0x0
+    in base 10, and the ports 0x1 and 0x2 as the Byte.
+
+    :param port: Address of the port
+    :type port: int
+    :param value: Value written
+    :type value: object from Byte
+
+    :return: Representation, with the newlines of the console
+    :rtype: str
+    """
+    value = int(value) if port == 0 else str(value)
+    return "\nOutput from port {0}: {1}\n".format(hex(port), value)
+
+
+class Handler(object):
+    """
+    Handler of the ports of the I/O space. This one leaves the
+    register as it is on reads and ignores the writes, and the others
+    extend it.
+    """
+    def read(self, port, reg):
+        """
+        Reads a port for the instruction IN.
+
+        :param port: Address of the port
+        :type port: int
+        :param reg: Register where the value is loaded
+        :type reg: int
+
+        :return: Value read, or None to leave the register as it is
+        :rtype: int
+        """
+        return None
+
+    def write(self, port, value):
+        """
+        Writes a port for the instruction OUT.
+
+        :param port: Address of the port
+        :type port: int
+        :param value: Value written
+        :type value: object from Byte
+        """
+        pass
+
+    def flush(self):
+        """
+        Writes the output kept by the handler, if any.
+        """
+        pass
+
+    def ready(self, port):
+        """
+        Tells if a read of a port could return a value or have any
+        other effect now. If not, the idle loops that poll the port
+        are fast-forwarded. By default, every read could.
+
+        :param port: Address of the port
+        :type port: int
+
+        :return: True if the port can not be skipped
+        :rtype: bool
+        """
+        return True
+
+    def can_become_ready(self, port):
+        """
+        Tells if a port that is not ready can become ready later, as a
+        queue that is pushed from another thread. If not, nothing can
+        leave an idle loop that polls the port. By default, it can not.
+
+        :param port: Address of the port
+        :type port: int
+
+        :return: True if it is worth waiting for the port
+        :rtype: bool
+        """
+        return False
+
+    def wait(self, port, timeout):
+        """
+        Blocks until a port is ready, or for timeout seconds.
+
+        :param port: Address of the port
+        :type port: int
+        :param timeout: Maximum seconds to wait
+        :type timeout: float
+
+        :return: True if the port is ready
+        :rtype: bool
+        """
+        if not self.ready(port):
+            time.sleep(timeout)
+        return self.ready(port)
+
+
+class Console(Handler):
+    """
+    Reads the keyboard on the port 0x0 and prints the writes as they
+    happen. It is the default handler of CONSOLE_PORTS.
+    """
+    def read(self, port, reg):
+        if port == 0:
+            return input("Input to R{}: ".format(reg))
+        return None
+
+    def write(self, port, value):
+        sys.stdout.write(output_text(port, value))
+
+    def ready(self, port):
+        return port == 0
+
+
+class InputQueue(Handler):
+    """
+    Feeds the reads from a queue of values given before the run, or
+    pushed while it runs, even from other threads.
+
+    :param values: Values of the reads, in order
+    :type values: iterable of int
+    :param default: Value of the reads when the queue is empty, None
+        to leave the register as it is
+    :type default: int
+    """
+    def __init__(self, values=(), default=None):
+        self._values = deque(values)
+        self._default = default
+        self._pushed = threading.Condition()
+
+    def __len__(self):
+        return len(self._values)
+
+    def push(self, value):
+        """
+        Adds a value at the end of the queue.
+
+        :param value: Value of a read
+        :type value: int
+        """
+        with self._pushed:
+            self._values.append(value)
+            self._pushed.notify_all()
+
+    def read(self, port, reg):
+        if self._values:
+            return self._values.popleft()
+        return self._default
+
+    def ready(self, port):
+        return bool(self._values) or self._default is not None
+
+    def can_become_ready(self, port):
+        return True
+
+    def wait(self, port, timeout):
+        with self._pushed:
+            if not self.ready(port):
+                self._pushed.wait(timeout)
+        return self.ready(port)
+
+
+class OutputBuffer(Handler):
+    """
+    Keeps the writes in memory, as the console would print them.
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, port, value):
+        self._chunks.append(output_text(port, value))
+
+    def ready(self, port):
+        return False
+
+    def write_text(self, text):
+        """
+        Keeps a text as if it had been written, as the output of a run
+        found on a cache.
+
+        :param text: Output
+        :type text: str
+        """
+        self._chunks.append(text)
+
+    def getvalue(self):
+        """
+        Returns the output kept.
+
+        :return: Output
+        :rtype: str
+        """
+        return "".join(self._chunks)
+
+    def clear(self):
+        """
+        Drops the output kept.
+        """
+        self._chunks = []
+
+
+class FileSink(OutputBuffer):
+    """
+    Writes the output to a file in batches of writes, and on flush.
+
+    :param f: File where the output is written
+    :type f: file
+    :param size: Writes of a batch
+    :type size: int
+    """
+    def __init__(self, f, size=256):
+        OutputBuffer.__init__(self)
+        self._f = f
+        self._size = size
+
+    def write(self, port, value):
+        self._chunks.append(output_text(port, value))
+        if len(self._chunks) >= self._size:
+            self.flush()
+
+    def flush(self):
+        self._f.write(self.getvalue())
+        self._f.flush()
+        self.clear()
+
+
+class Callback(Handler):
+    """
+    Calls functions on the reads and the writes.
+
+    :param read: Called with the port and the register on reads, and
+        returns the value read or None
+    :type read: function
+    :param write: Called with the port and the value on writes
+    :type write: function
+    """
+    def __init__(self, read=None, write=None):
+        self._read = read
+        self._write = write
+
+    def read(self, port, reg):
+        if self._read is None:
+            return None
+        return self._read(port, reg)
+
+    def ready(self, port):
+        return self._read is not None
+
+    def write(self, port, value):
+        if self._write is not None:
+            self._write(port, value)
+
+
+class InputRecorder(Handler):
+    """
+    Reads from another handler, the console by default, and records
+    every read with the cycles of the state, that set the point of
+    the run deterministically, and the value read. The reads that
+    leave the register as it is are recorded with NO_VALUE. The
+    records are written to the file in batches of INPUT_RECORD, and
+    on flush. The writes are passed to the other handler, so the
+    recorder can be bound in its place.
+
+    :param state: State of the run
+    :type state: object from State
+    :param f: Binary file where the records are written
+    :type f: file
+    :param handler: Handler of the reads and the writes, a new Console
+        if None
+    :type handler: object from Handler
+    :param size: Records of a batch
+    :type size: int
+    """
+    def __init__(self, state, f, handler=None, size=256):
+        self._state = state
+        self._f = f
+        self._handler = Console() if handler is None else handler
+        self._size = size
+        self._records = bytearray()
+
+    def read(self, port, reg):
+        value = self._handler.read(port, reg)
+        if value is None:
+            record = INPUT_RECORD.pack(self._state.cycles, port | NO_VALUE, 0)
+        else:
+            value = int(value) & 0xFF
+            record = INPUT_RECORD.pack(self._state.cycles, port, value)
+        self._records.extend(record)
+        if len(self._records) >= self._size * INPUT_RECORD.size:
+            self.flush()
+        return value
+
+    def write(self, port, value):
+        self._handler.write(port, value)
+
+    def flush(self):
+        self._f.write(bytes(self._records))
+        self._f.flush()
+        self._records = bytearray()
+        self._handler.flush()
+
+
+class InputReplay(Handler):
+    """
+    Feeds the reads with the values recorded by an InputRecorder,
+    without touching the keyboard. The whole file is loaded in arrays
+    when the replay is built, so a read only takes the next value.
+    The writes are passed to another handler, so the replay can be
+    bound on the same ports as the recorder.
+
+    Every read takes the next record. If strict is set, a record of
+    other cycles or of other port, or a read after the last record,
+    raises ReplayError, as the run does not follow the recorded one;
+    if not, the records are taken in order and the reads after the
+    last one leave the register as it is.
+
+    :param state: State of the run
+    :type state: object from State
+    :param path: Path to the file of records
+    :type path: str
+    :param strict: Check the cycles and the ports of the records
+    :type strict: bool
+    :param handler: Handler of the writes, a new Console if None
+    :type handler: object from Handler
+    """
+    def __init__(self, state, path, strict=True, handler=None):
+        self._state = state
+        self._strict = strict
+        self._handler = Console() if handler is None else handler
+        self._cycles = array('L')
+        self._ports = bytearray()
+        self._values = bytearray()
+        for cycles, port, value in read_input(path):
+            self._cycles.append(cycles)
+            self._ports.append(port)
+            self._values.append(value)
+        self._next = 0
+
+    def __len__(self):
+        return len(self._values) - self._next
+
+    def skip(self, count):
+        """
+        Takes some records without reading them, as a run whose result
+        is known already would have read them.
+
+        :param count: Records to take
+        :type count: int
+        """
+        self._next = min(self._next + count, len(self._values))
+
+    def read(self, port, reg):
+        x = self._next
+        if x == len(self._values):
+            if self._strict:
+                raise ReplayError("No input recorded for port {0} at cycle "
+                                  "{1}".format(hex(port), self._state.cycles))
+            return None
+        recorded = self._ports[x] & ~NO_VALUE
+        if self._strict and (self._cycles[x] != self._state.cycles or
+                             recorded != port):
+            raise ReplayError("Input of port {0} recorded at cycle {1} read "
+                              "from port {2} at cycle {3}".format(
+                              hex(recorded), self._cycles[x], hex(port),
+                              self._state.cycles))
+        self._next = x + 1
+        if self._ports[x] & NO_VALUE:
+            return None
+        return self._values[x]
+
+    def write(self, port, value):
+        self._handler.write(port, value)
+
+    def flush(self):
+        self._handler.flush()
+
+
+def read_input(path):
+    """
+    Reads a file of records of InputRecorder.
+
+    :param path: Path to the file
+    :type path: str
+
+    :return: Records as tuples of cycles, port and value
+    :rtype: list of tuples
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    return [INPUT_RECORD.unpack_from(raw, x) for x in
+            range(0, len(raw) - INPUT_RECORD.size + 1, INPUT_RECORD.size)]
+
+
+class PortBus(object):
+    """
+    Binds every port of the I/O space to a handler. The instructions
+    IN and OUT access the ports through the bus, and the ports without
+    handler leave the register as it is and ignore the writes. By
+    default, CONSOLE_PORTS are bound to a Console.
+    """
+    def __init__(self):
+        self._handlers = [None] * NPORTS
+        self.bind(CONSOLE_PORTS, Console())
+
+    def __getitem__(self, port):
+        return self._handlers[port]
+
+    def bind(self, ports, handler):
+        """
+        Binds some ports to a handler.
+
+        :param ports: Address of a port, or addresses of several
+        :type ports: int or iterable of int
+        :param handler: Handler of the ports, None to unbind them
+        :type handler: object from Handler
+        """
+        if isinstance(ports, int):
+            ports = [ports]
+        for port in ports:
+            self._handlers[port] = handler
+
+    def read(self, port, reg):
+        """
+        Reads a port through its handler.
+
+        :param port: Address of the port
+        :type port: int
+        :param reg: Register where the value is loaded
+        :type reg: int
+
+        :return: Value read, or None to leave the register as it is
+        :rtype: int
+        """
+        handler = self._handlers[port]
+        if handler is None:
+            return None
+        return handler.read(port, reg)
+
+    def write(self, port, value):
+        """
+        Writes a port through its handler.
+
+        :param port: Address of the port
+        :type port: int
+        :param value: Value written
+        :type value: object from Byte
+        """
+        handler = self._handlers[port]
+        if handler is not None:
+            handler.write(port, value)
+
+    def ready(self, ports):
+        """
+        Tells if any of some ports is ready. The ports without handler
+        never are.
+
+        :param ports: Addresses of the ports
+        :type ports: iterable of int
+
+        :return: True if a read of any port could return a value or
+            have any other effect
+        :rtype: bool
+        """
+        for port in ports:
+            handler = self._handlers[port]
+            if handler is not None and handler.ready(port):
+                return True
+        return False
+
+    def can_become_ready(self, ports):
+        """
+        Tells if any of some ports that are not ready can become ready
+        later. The ports without handler never can.
+
+        :param ports: Addresses of the ports
+        :type ports: iterable of int
+
+        :return: True if it is worth waiting for the ports
+        :rtype: bool
+        """
+        for port in ports:
+            handler = self._handlers[port]
+            if handler is not None and handler.can_become_ready(port):
+                return True
+        return False
+
+    def wait(self, ports, timeout):
+        """
+        Blocks until any of some ports is ready, or for timeout seconds.
+        The wait is left to the handler when all the ports have the
+        same one.
+
+        :param ports: Addresses of the ports
+        :type ports: list of int
+        :param timeout: Maximum seconds to wait
+        :type timeout: float
+
+        :return: True if any port is ready
+        :rtype: bool
+        """
+        handlers = set(self._handlers[port] for port in ports)
+        if len(handlers) == 1 and None not in handlers:
+            return handlers.pop().wait(ports[0], timeout)
+        if not self.ready(ports):
+            time.sleep(timeout)
+        return self.ready(ports)
+
+    def flush(self):
+        """
+        Flushes the output of all the handlers.
+        """
+        done = []
+        for handler in self._handlers:
+            if handler is not None and handler not in done:
+                handler.flush()
+                done.append(handler)
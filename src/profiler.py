@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+from timeit import default_timer
+
+from instruction import Brbs, Brbc
+
+
+class Profiler(object):
+    """
+    Collects statistics of the executions of AvrMcu.run that receive
+    it. The statistics are accumulated run after run until clear is
+    called:
+
+    - Executions of every address of program memory.
+    - Executions and host time of every class of instruction.
+    - Taken and not taken executions of every conditional branch.
+
+    The instrumented loop of run executes the instructions through
+    the profiler, so the simulations without profiler do not pay for
+    it.
+
+    :ivar pcs: Executions by address
+    :vartype pcs: dict of int
+    :ivar instructions: Executions and host nanoseconds by class of
+        instruction
+    :vartype instructions: dict of lists
+    :ivar branches: Taken and not taken executions by address of branch
+    :vartype branches: dict of lists
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """
+        Discards all the statistics.
+        """
+        self.pcs = {}
+        self.instructions = {}
+        self.branches = {}
+
+    def execute(self, pc, dec, state):
+        """
+        Executes an instruction, as the instrumented loop of AvrMcu.run
+        does, and counts it. The host time of an instruction is only
+        counted if it does not raise an exception.
+
+        :param pc: Address of the instruction
+        :type pc: int
+        :param dec: Decoded instruction
+        :type dec: object from instruction.Decoded
+        :param state: State of the simulation
+        :type state: object from State
+        """
+        runner = dec.runner
+        pcs = self.pcs
+        pcs[pc] = pcs.get(pc, 0) + 1
+        inst = self.instructions.get(runner.__class__)
+        if inst is None:
+            inst = self.instructions[runner.__class__] = [0, 0]
+        inst[0] = inst[0] + 1
+
+        cycles = state.cycles
+        start = default_timer()
+        runner.execute_decoded(dec, state)
+        inst[1] = inst[1] + int((default_timer() - start) * 1e9)
+
+        if isinstance(runner, (Brbs, Brbc)):
+            branch = self.branches.get(pc)
+            if branch is None:
+                branch = self.branches[pc] = [0, 0]
+            # A taken branch costs a cycle more, even if k is 0
+            branch[state.cycles - cycles == runner.cycles] += 1
+
+    def hot_pcs(self, n=None):
+        """
+        Returns the most executed addresses, from more to less
+        executions.
+
+        :param n: Number of addresses, all if None
+        :type n: int
+
+        :return: Pairs of address and executions
+        :rtype: list of tuples
+        """
+        hot = sorted(self.pcs.items(), key=lambda x: (-x[1], x[0]))
+        return hot if n is None else hot[:n]
+
+    def to_dict(self):
+        """
+        Represents the statistics with builtin types, as they are
+        saved in JSON.
+
+        :return: Statistics
+        :rtype: dict
+        """
+        return {"pcs": [[pc, n] for pc, n in self.hot_pcs()],
+                "instructions": dict((cls.__name__, {"count": x[0],
+                                                     "ns": x[1]})
+                                     for cls, x in self.instructions.items()),
+                "branches": [[pc, x[0], x[1]]
+                             for pc, x in sorted(self.branches.items())]}
+
+    def save_json(self, path):
+        """
+        Saves the statistics on a JSON file.
+
+        :param path: Path of the file
+        :type path: str
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1, sort_keys=True)
+
+    def report(self, n=10):
+        """
+        Represents the statistics as text tables like this:
+
+        Instruction      Count           ns    ns/inst
+        Add                 10         2500      250.0
+
+        PC           Count
+        0X0004          10
+
+        Branch       Taken  Not taken
+        0X0006           9          1
+
+        :param n: Number of addresses of the table of PCs
+        :type n: int
+
+        :return: Representation
+        :rtype: str
+        """
+        lines = ["{0:<12} {1:>9} {2:>12} {3:>10}".format("Instruction",
+                 "Count", "ns", "ns/inst")]
+        for cls, x in sorted(self.instructions.items(),
+                             key=lambda x: (-x[1][1], x[0].__name__)):
+            lines.append("{0:<12} {1:>9} {2:>12} {3:>10.1f}".format(
+                         cls.__name__, x[0], x[1], float(x[1]) / x[0]))
+
+        lines.append("")
+        lines.append("{0:<8} {1:>9}".format("PC", "Count"))
+        for pc, count in self.hot_pcs(n):
+            lines.append("0X{0:04X} {1:>11}".format(pc, count))
+
+        lines.append("")
+        lines.append("{0:<8} {1:>9} {2:>10}".format("Branch", "Taken",
+                     "Not taken"))
+        for pc, x in sorted(self.branches.items()):
+            lines.append("0X{0:04X} {1:>11} {2:>10}".format(pc, x[0], x[1]))
+
+        return "\n".join(lines) + "\n"
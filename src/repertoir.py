@@ -2,17 +2,107 @@
 # -*- coding: utf-8 -*-
 
 from avrexcep import UnknownCodeError
+from instruction import InstRunner
+
+NOPCODES = 0x10000 # Number of 16-bit opcodes
+
+class Unknown(InstRunner):
+    """
+    Sentinel of the decode table. It stands for every opcode that
+    none of the instructions of the repertoir can execute, and raises
+    UnknownCodeError when it is executed.
+    """
+    def __init__(self):
+        self.name = "Unknown"
+        self._mask = ""
+        self._code = ""
+
+    def match(self, instr):
+        return False
+
+    def execute_decoded(self, dec, state):
+        raise UnknownCodeError
+
+
+UNKNOWN = Unknown()
 
 class Repertoir(object):
     """
     Represents a set of instructions of an MCU. If we give an
     instruction it returns the corresponding InstRunner object.
 
+    The decode table is built once, when the repertoir is created. It
+    has an entry for every 16-bit opcode, with the InstRunner that
+    executes it or UNKNOWN. When the masks of two instructions
+    overlap, the first one of the list wins, as the old linear search
+    did, and the pair is kept in the list of overlaps.
+
     :param li: List of instances of InstRunner
     :type li: list of objects
+    :ivar _table: Decode table indexed by opcode
+    :vartype _table: list of objects
+    :ivar _overlaps: Pairs of instructions with overlapped opcodes
+    :vartype _overlaps: list of tuples
     """
     def __init__(self, li):
         self._li = li
+        self._table = [UNKNOWN] * NOPCODES
+        self._overlaps = []
+
+        for x in self._li:
+            for opcode in self._opcodes(x):
+                runner = self._table[opcode]
+                if runner is UNKNOWN:
+                    self._table[opcode] = x
+                elif (runner, x) not in self._overlaps:
+                    self._overlaps.append((runner, x))
+
+    def _opcodes(self, runner):
+        """
+        Generates all the opcodes that match the mask and the code of
+        an InstRunner, walking the bits out of the mask.
+
+        :param runner: Instruction
+        :type runner: instance of InstRunner
+
+        :return: Opcodes
+        :rtype: generator of int
+        """
+        mask = int(runner._mask, 2)
+        code = int(runner._code, 2) & mask
+        free = ~mask & (NOPCODES - 1) # Bits out of the mask
+
+        bits = free
+        while True:
+            yield code | bits
+            if bits == 0:
+                break
+            bits = (bits - 1) & free
+
+    def overlaps(self):
+        """
+        Reports the pairs of instructions whose masks and codes
+        overlap. In each pair, the first instruction is the one that
+        executes the shared opcodes.
+
+        :return: Overlapped instructions
+        :rtype: list of tuples of InstRunner
+        """
+        return list(self._overlaps)
+
+    def decode(self, instr):
+        """
+        Returns the InstRunner that can execute instruction instr with
+        a single lookup on the decode table. If it does not exist it
+        returns UNKNOWN, that raises UnknownCodeError when executed.
+
+        :param instr: Intruction
+        :type instr: instance from Word
+
+        :return: Intruction
+        :rtype: instance of InstRunner
+        """
+        return self._table[int(instr) & (NOPCODES - 1)]
 
     def find(self, instr):
         """
@@ -26,8 +116,7 @@ class Repertoir(object):
         :return: Intruction
         :rtype: instance of InstRunner
         """
-        for x in self._li:
-            if x.match(instr):
-                return x
-        else:
+        runner = self.decode(instr)
+        if runner is UNKNOWN:
             raise UnknownCodeError
+        return runner
@@ -3,8 +3,38 @@
 
 from bitvec import Byte, Word
 from memory import DataMemory, ProgramMemory
+from ports import PortBus
 
 C, Z, N = 0, 1, 2 # CARRY, ZERO, NEG
+
+class Snapshot(object):
+    """
+    Copy of a State, as compact buffers, taken by State.snapshot.
+
+    :ivar data: Content of data memory
+    :vartype data: bytearray
+    :ivar prog: Content of program memory
+    :vartype prog: array('H')
+    :ivar pc: Program Counter
+    :vartype pc: int
+    :ivar flags: Register status
+    :vartype flags: int
+    :ivar eeprom: Content of EEPROM
+    :vartype eeprom: bytearray
+    :ivar cycles: Cycles executed since reset
+    :vartype cycles: int
+    """
+    __slots__ = ('data', 'prog', 'pc', 'flags', 'eeprom', 'cycles')
+
+    def __init__(self, data, prog, pc, flags, eeprom, cycles):
+        self.data = data
+        self.prog = prog
+        self.pc = pc
+        self.flags = flags
+        self.eeprom = eeprom
+        self.cycles = cycles
+
+
 class State(object):
     """
     Represents the state of MCU. Is formed by all the registers and
@@ -16,14 +46,152 @@ class State(object):
     :vartype prog: obj
     :ivar pc: Program Counter
     :vartype pc:
-    :ivar flags: Register status
-    :vartype flags: int
+    :ivar flags: Register status, with the flags of the last ALU
+        operation computed when it is read
+    :vartype flags: object from Byte
+    :ivar eeprom: Content of EEPROM
+    :vartype eeprom: bytearray
+    :ivar cycles: Cycles executed since reset
+    :vartype cycles: int
+    :ivar ports: Bus of the I/O ports, shared with the forks
+    :vartype ports: object from PortBus
     """
     def __init__(self, data=128, prog=128):
         self.data = DataMemory(data)
         self.prog = ProgramMemory(prog)
         self.pc = Word()
         self.flags = Byte()
+        self.eeprom = bytearray()
+        self.cycles = 0
+        self.ports = PortBus()
+
+    @property
+    def flags(self):
+        """
+        Register status. The ALU operations do not write the flags,
+        they only keep their result in _result, from which NEG and ZERO
+        are computed, and their carry in _carry, None if the operation
+        keeps CARRY. Every operation sets _result, so nothing is pending
+        while it is None. Most results are overwritten before a branch,
+        Adc or a dump reads the flags, so they are written here, when
+        they are read.
+        """
+        if self._result is not None:
+            w = self._flags._w
+            if self._carry is not None:
+                w = (w | 0x80) if self._carry else (w & 0x7F)
+            w = w & 0x9F
+            if self._result == 0:
+                w = w | 0x40 # ZERO
+            elif self._result < 0:
+                w = w | 0x20 # NEG
+            self._flags._w = w
+            self._result = None
+            self._carry = None
+        return self._flags
+
+    @flags.setter
+    def flags(self, flags):
+        self._flags = flags
+        self._result = None
+        self._carry = None
+
+    def snapshot(self):
+        """
+        Copies the memories, the registers and the counters of the
+        state.
+
+        :return: Copy of the state
+        :rtype: object from Snapshot
+        """
+        return Snapshot(self.data.get_raw(), self.prog.get_raw(),
+                        int(self.pc), int(self.flags), self.eeprom[:],
+                        self.cycles)
+
+    def restore(self, snap):
+        """
+        Sets the state to a copy taken by snapshot, copying the
+        buffers in place. The decoded instructions are kept if the
+        program has not changed.
+
+        :param snap: Copy of the state
+        :type snap: object from Snapshot
+        """
+        self.data.set_raw(snap.data)
+        self.prog.set_raw(snap.prog)
+        self.pc = Word(snap.pc)
+        self.flags = Byte(snap.flags)
+        self.eeprom = snap.eeprom[:]
+        self.cycles = snap.cycles
+
+    def fork(self):
+        """
+        Builds a copy of the state that shares the pages of data and
+        program memory with it. A page is copied only on the first
+        write of the fork or of this state to it, so many forks can be
+        taken from the same state, and the dirty pages and the diffs
+        are found from the page tables.
+
+        :return: Fork of the state
+        :rtype: object from State
+        """
+        child = object.__new__(State)
+        child.__dict__.update(self.__dict__)
+        child.data = self.data.fork()
+        child.prog = self.prog.fork()
+        child.pc = Word(int(self.pc))
+        child.flags = Byte(int(self.flags))
+        child.eeprom = self.eeprom[:]
+        return child
+
+    def dirty_pages(self):
+        """
+        Returns the pages of the memories that have changed since the
+        state was forked.
+
+        :return: Numbers of the pages of data and of program memory
+        :rtype: dict of lists
+        """
+        return {"data": self.data.dirty_pages(),
+                "prog": self.prog.dirty_pages()}
+
+    def diff(self, other):
+        """
+        Compares the state with another one, as a fork with its
+        parent. Only the pages that are not shared are read.
+
+        :param other: State with memories of the same size
+        :type other: object from State
+
+        :return: Cells of data and program memory that differ, as
+            address, own content and content of other, and the pairs of
+            pc, flags and cycles that differ
+        :rtype: dict
+        """
+        result = {"data": self.data.diff(other.data),
+                  "prog": self.prog.diff(other.prog)}
+        for name in ("pc", "flags", "cycles"):
+            mine, theirs = int(getattr(self, name)), int(getattr(other, name))
+            if mine != theirs:
+                result[name] = (mine, theirs)
+        return result
+
+    def reset(self, keep_program=True):
+        """
+        Sets data memory, PC, flags and the cycle counter to 0 in
+        place. Program memory and EEPROM are kept, unless
+        keep_program is False.
+
+        :param keep_program: Keep the program installed
+        :type keep_program: bool
+        """
+        self.data.clear()
+        self.pc = Word()
+        self.flags = Byte()
+        self.cycles = 0
+        if not keep_program:
+            self.prog.clear()
+            self.eeprom = bytearray()
 
     def dump_data(self):
         """
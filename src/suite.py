@@ -0,0 +1,418 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+
+from bitvec import Word
+from avrmcu import AvrMcu
+from state import C, Z, N
+from ports import OutputBuffer, CONSOLE_PORTS
+
+TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests")
+GOLDEN = os.path.join(TESTS, "golden.json") # Final states of the cases
+BASELINE = os.path.join(TESTS, "baseline.json") # Scores of the kernels, on
+                                                # this host, not in git
+THRESHOLD = 0.25 # Fraction of the baseline score that can be lost
+MAX_STEPS = 1000000 # Maximum instructions of a case
+CALIBRATION = 200000 # Iterations of the calibration loop
+
+# Keys of a result that are checked against the golden values
+GOLDEN_KEYS = ("reason", "steps", "cycles", "pc", "flags", "registers",
+               "output")
+
+
+#####################################################################
+# Kernels
+#####################################################################
+def _rd_rr(code, d, r):
+    """
+    Encodes an instruction with registers Rd and Rr, as ADD.
+    """
+    return Word(code | ((r & 0x10) << 5) | (d << 4) | (r & 0xF))
+
+
+def _rd_k(code, d, k):
+    """
+    Encodes an instruction with register Rd from 16 and a constant K,
+    as LDI.
+    """
+    return Word(code | ((k & 0xF0) << 4) | ((d - 16) << 4) | (k & 0xF))
+
+
+# Registers and values loaded by the kernels before the loops
+SEED = [(17, 0x35), (18, 0x0B), (19, 0xC1), (21, 0x7E), (22, 0x91),
+        (23, 0x24), (24, 0xF0), (25, 0x5A)]
+
+
+def _loop(body, n, m=250):
+    """
+    Builds a program that loads SEED, runs a body n * m times, in two
+    nested loops with the counters on r20 and r16, and ends with BREAK.
+
+    :param body: Instructions of the body, that keep r16 and r20
+    :type body: list of Word
+    :param n: Iterations of the outer loop, from 1 to 255
+    :type n: int
+    :param m: Iterations of the inner loop, from 1 to 255
+    :type m: int
+
+    :return: Program
+    :rtype: list of Word
+    """
+    b = len(body)
+    seed = [_rd_k(0xE000, d, k) for d, k in SEED]
+    return (seed + [_rd_k(0xE000, 20, n), _rd_k(0xE000, 16, m)] + body +
+            [_rd_k(0x5000, 16, 1), # SUBI r16, 1
+             Word(0xF400 | ((-(b + 2) & 0x7F) << 3) | Z), # BRBC Z to body
+             _rd_k(0x5000, 20, 1), # SUBI r20, 1
+             Word(0xF400 | ((-(b + 5) & 0x7F) << 3) | Z), # BRBC Z to LDI
+             Word(0x9598)]) # BREAK
+
+
+def alu_kernel(n=120):
+    """
+    Loop of ADD, ADC, SUB and SUBI.
+    """
+    return _loop([_rd_rr(0x0C00, 17, 18), _rd_rr(0x1C00, 19, 21),
+                  _rd_rr(0x1800, 22, 23), _rd_k(0x5000, 24, 3),
+                  _rd_rr(0x0C00, 23, 22)], n)
+
+
+def logic_kernel(n=120):
+    """
+    Loop of AND, OR, EOR, LSR and MOV.
+    """
+    return _loop([_rd_rr(0x2000, 17, 18), _rd_rr(0x2800, 19, 21),
+                  _rd_rr(0x2400, 22, 23), Word(0x9406 | (24 << 4)),
+                  _rd_rr(0x2C00, 25, 24)], n)
+
+
+def memory_kernel(n=120):
+    """
+    Loop of STS and LDS, that take two cycles, and ADD.
+    """
+    return _loop([Word(0x9310), # STS 0x30, r17
+                  Word(0x9129), # LDS 0x19, r18
+                  _rd_rr(0x0C00, 17, 25), Word(0x9317), # STS 0x37, r17
+                  Word(0)], n) # NOP
+
+
+KERNELS = [("kernel:alu", alu_kernel), ("kernel:logic", logic_kernel),
+           ("kernel:memory", memory_kernel)]
+
+
+def calibrate(n=CALIBRATION, repeat=5):
+    """
+    Measures the speed of the host on a plain Python loop, the best of
+    repeat runs. The throughput of the cases is divided by it, so the
+    scores do not move with the load or the clock of the host.
+
+    :param n: Iterations of the loop
+    :type n: int
+    :param repeat: Runs of the loop
+    :type repeat: int
+
+    :return: Iterations per second
+    :rtype: float
+    """
+    best = None
+    for x in range(repeat):
+        start = time.time()
+        t = 0
+        for i in xrange(n):
+            t = (t + i) & 0xFF
+        seconds = time.time() - start
+        if best is None or seconds < best:
+            best = seconds
+    return n / best if best > 0 else float(n)
+
+
+def host_of():
+    """
+    Describes the host and the interpreter, that a baseline is only
+    valid for.
+
+    :return: Description
+    :rtype: str
+    """
+    return "{0} {1} {2} {3}".format(platform.node(), platform.machine(),
+                                    platform.python_implementation(),
+                                    platform.python_version())
+
+
+#####################################################################
+# Cases
+#####################################################################
+def find_cases(path=TESTS):
+    """
+    Finds the programs of a directory and of its subdirectories, that
+    are the .hex files that are not EEPROM images (.eep.hex).
+
+    :param path: Directory
+    :type path: str
+
+    :return: Paths of the programs, sorted
+    :rtype: list of str
+    """
+    cases = []
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            if name.endswith(".hex") and not name.endswith(".eep.hex"):
+                cases.append(os.path.join(root, name))
+    return sorted(cases)
+
+
+def run_case(avrmcu, name, load, max_steps=MAX_STEPS, repeat=1):
+    """
+    Runs a case from reset until a BREAK, an error or max_steps
+    instructions, headless, repeat times, and measures the best run.
+
+    :param avrmcu: Simulator
+    :type avrmcu: object from AvrMcu
+    :param name: Name of the case
+    :type name: str
+    :param load: Installs the program of the case on the simulator
+    :type load: function
+    :param max_steps: Maximum instructions to execute
+    :type max_steps: int
+    :param repeat: Runs of the case
+    :type repeat: int
+
+    :return: Result with keys name, the ones of GOLDEN_KEYS, load,
+        seconds, ips (instructions per second) and process_peak_kb
+        (ru_maxrss, the peak resident memory of the whole process so
+        far, not of the case alone)
+    :rtype: dict
+    """
+    best = None
+    for x in range(repeat):
+        avrmcu.reset(keep_program=False)
+        output = OutputBuffer()
+        avrmcu._s.ports.bind(CONSOLE_PORTS, output)
+        start = time.time()
+        load(avrmcu)
+        loaded = time.time() - start
+        run = avrmcu.run(max_steps)
+        if best is None or run.seconds < best[1].seconds:
+            best = (loaded, run)
+
+    loaded, run = best
+    state = avrmcu._s
+    return {"name": name, "reason": run.reason, "steps": run.steps,
+            "cycles": run.cycles, "pc": int(state.pc),
+            "flags": {"C": int(state.flags[C]), "Z": int(state.flags[Z]),
+                      "N": int(state.flags[N])},
+            "registers": list(state.data.get_raw()[:32]),
+            "output": output.getvalue(), "load": loaded,
+            "seconds": run.seconds,
+            "ips": run.steps / run.seconds if run.seconds > 0 else 0.0,
+            "process_peak_kb":
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def run_suite(paths=None, kernels=KERNELS, max_steps=MAX_STEPS, repeat=3):
+    """
+    Runs the programs and the kernels of the suite. The programs run
+    once, and the kernels repeat times, for stable numbers. Every
+    result gets a score too, that is its ips divided by the speed of
+    the calibration loop, run before the cases.
+
+    :param paths: Paths to the .hex files, the ones of TESTS if None
+    :type paths: list of str
+    :param kernels: Names and builders of the kernels
+    :type kernels: list of tuples
+    :param max_steps: Maximum instructions of each case
+    :type max_steps: int
+    :param repeat: Runs of each kernel
+    :type repeat: int
+
+    :return: Results of run_case, with key score
+    :rtype: list of dict
+    """
+    if paths is None:
+        paths = find_cases()
+    speed = calibrate()
+    avrmcu = AvrMcu()
+    results = []
+    for path in paths:
+        name = os.path.relpath(path, TESTS)
+        results.append(run_case(avrmcu, name,
+                                lambda avrmcu: avrmcu.load_hex(path),
+                                max_steps))
+    for name, kernel in kernels:
+        prog = kernel()
+        results.append(run_case(avrmcu, name,
+                                lambda avrmcu: avrmcu.set_prog(prog),
+                                max_steps, repeat))
+    for x in results:
+        x["score"] = x["ips"] / speed
+    return results
+
+
+#####################################################################
+# Checks
+#####################################################################
+def check_golden(results, golden):
+    """
+    Compares the final states of the cases with the golden ones.
+
+    :param results: Results of run_case
+    :type results: list of dict
+    :param golden: Values of GOLDEN_KEYS of every case, by name
+    :type golden: dict
+
+    :return: Description of every difference
+    :rtype: list of str
+    """
+    failures = []
+    for x in results:
+        expected = golden.get(x["name"])
+        if expected is None:
+            failures.append("{0}: no golden values".format(x["name"]))
+            continue
+        for key in GOLDEN_KEYS:
+            if x[key] != expected[key]:
+                failures.append("{0}: {1} is {2!r}, expected {3!r}".format(
+                                x["name"], key, x[key], expected[key]))
+    return failures
+
+
+def check_baseline(results, baseline, threshold=THRESHOLD):
+    """
+    Compares the scores of the cases with the baseline. A baseline
+    saved on another host or interpreter is not checked, as the scores
+    only compare well on the same one, and neither are the cases
+    without baseline.
+
+    :param results: Results of run_suite
+    :type results: list of dict
+    :param baseline: Host and scores of the cases by name, as
+        baseline_of returns
+    :type baseline: dict
+    :param threshold: Fraction of the baseline that can be lost
+    :type threshold: float
+
+    :return: Description of every regression
+    :rtype: list of str
+    """
+    failures = []
+    if baseline.get("host") != host_of():
+        return failures
+    scores = baseline.get("scores", {})
+    for x in results:
+        expected = scores.get(x["name"])
+        if expected and x["score"] < expected * (1 - threshold):
+            failures.append("{0}: score {1:.3f}, baseline {2:.3f}".format(
+                            x["name"], x["score"], expected))
+    return failures
+
+
+def golden_of(results):
+    """
+    Takes the golden values of some results.
+
+    :param results: Results of run_case
+    :type results: list of dict
+
+    :return: Values of GOLDEN_KEYS of every case, by name
+    :rtype: dict
+    """
+    return dict((x["name"], dict((key, x[key]) for key in GOLDEN_KEYS))
+                for x in results)
+
+
+def baseline_of(results):
+    """
+    Takes the scores of the kernels of some results, that are the
+    only cases long enough for a stable baseline, and the host where
+    they were measured.
+
+    :param results: Results of run_suite
+    :type results: list of dict
+
+    :return: Host, and scores of the kernels by name
+    :rtype: dict
+    """
+    return {"host": host_of(),
+            "scores": dict((x["name"], x["score"]) for x in results
+                           if x["name"].startswith("kernel:"))}
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save(path, values):
+    with open(path, "w") as f:
+        json.dump(values, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='AVR benchmark and golden '
+                                     'suite')
+    parser.add_argument('-n',
+                        type=int,
+                        default=MAX_STEPS,
+                        help='Maximum instructions of each case')
+    parser.add_argument('--repeat',
+                        type=int,
+                        default=3,
+                        help='Runs of each kernel')
+    parser.add_argument('--threshold',
+                        type=float,
+                        default=THRESHOLD,
+                        help='Fraction of the baseline score that can '
+                             'be lost')
+    parser.add_argument('--golden',
+                        type=str,
+                        default=GOLDEN,
+                        help='JSON file with the golden values')
+    parser.add_argument('--baseline',
+                        type=str,
+                        default=BASELINE,
+                        help='JSON file with the baseline scores of this '
+                             'host')
+    parser.add_argument('--update-golden',
+                        action="store_true",
+                        default=False,
+                        help='Store the final states as golden values')
+    parser.add_argument('--save-baseline',
+                        action="store_true",
+                        default=False,
+                        help='Store the scores as baseline of this host')
+    parser.add_argument('-o',
+                        type=str,
+                        default=None,
+                        help='Write the results to a JSON file')
+    args = parser.parse_args()
+
+    results = run_suite(max_steps=args.n, repeat=args.repeat)
+    if args.update_golden:
+        _save(args.golden, golden_of(results))
+    if args.save_baseline:
+        _save(args.baseline, baseline_of(results))
+
+    baseline = _load(args.baseline)
+    if baseline and baseline.get("host") != host_of():
+        sys.stderr.write("Baseline of another host not checked, run with "
+                         "--save-baseline\n")
+    failures = (check_golden(results, _load(args.golden)) +
+                check_baseline(results, baseline, args.threshold))
+    report = {"results": results, "failures": failures}
+    if args.o:
+        _save(args.o, report)
+    else:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        print
+
+    sys.exit(1 if failures else 0)
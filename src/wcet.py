@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+
+from bitvec import Word
+from avrexcep import AnalysisError
+from instruction import Brbs, Brbc, Break
+from cfg import CfgBuilder
+
+STOP = -1 # Stands for the end of the program on a BREAK
+
+
+class Bounds(object):
+    """
+    Represents the cycles that a region of a program can take.
+
+    :ivar best: Cycles of the shortest path
+    :vartype best: int
+    :ivar worst: Cycles of the longest path
+    :vartype worst: int
+    """
+    __slots__ = ('best', 'worst')
+
+    def __init__(self, best, worst):
+        self.best = best
+        self.worst = worst
+
+    def __repr__(self):
+        return "{0} to {1} cycles".format(self.best, self.worst)
+
+    def contains(self, cycles):
+        """
+        Checks if a measured number of cycles is inside the bounds.
+
+        :param cycles: Cycles of a run
+        :type cycles: int
+
+        :return: True if best <= cycles <= worst
+        :rtype: bool
+        """
+        return self.best <= cycles <= self.worst
+
+
+class WcetAnalyzer(object):
+    """
+    Computes the best and the worst cycles that a program takes from
+    an address to another one, or to a BREAK, without running it.
+
+    The control-flow graph of the program is weighted with the cycles
+    of every InstRunner, one more on the taken way of a branch. Every
+    loop must have a bound of the executions of its first instruction
+    each time that it is entered, given as the maximum or as a pair
+    (minimum, maximum); the minimum is 1 when it is not given. The
+    loops are collapsed from the innermost, each one as its paths to
+    the exits plus the iterations, and the longest and the shortest
+    paths of what is left are found in topological order. The paths
+    that end on an error are not counted.
+
+    :param decode: Returns the decoded instruction of an address
+    :type decode: function
+    """
+    def __init__(self, decode):
+        self._decode = decode
+        self._builder = CfgBuilder(decode)
+
+    def analyze(self, state, start=0, end=None, loops=None):
+        """
+        Computes the bounds of the cycles from an address until PC
+        reaches another one, or until a BREAK, its cycle included.
+
+        :param state: State with the program
+        :type state: object from State
+        :param start: Address of the first instruction
+        :type start: int
+        :param end: Address where the region ends, a BREAK if None
+        :type end: int
+        :param loops: Bound of the iterations of every loop, by the
+            address of its first instruction
+        :type loops: dict
+
+        :return: Bounds of the cycles
+        :rtype: object from Bounds
+        """
+        self._loops = {}
+        for addr, bound in (loops or {}).items():
+            if isinstance(bound, tuple):
+                self._loops[addr] = bound
+            else:
+                self._loops[addr] = (1, bound)
+
+        target = STOP if end is None else end
+        edges = self._edges(self._builder.build(state, start), end)
+
+        # Instructions of the region, that ends at the target
+        nodes = set([start])
+        pending = [start] if start in edges else []
+        while pending:
+            for x, best, worst in edges[pending.pop()]:
+                if x not in nodes and x not in (target, STOP):
+                    nodes.add(x)
+                    pending.append(x)
+
+        exits = self._paths(edges, start, nodes) if start in edges else {}
+        if target not in exits:
+            raise AnalysisError("No path from 0X{0:04X} to {1}".format(
+                                start, "BREAK" if end is None else
+                                "0X{0:04X}".format(end)))
+        return Bounds(*exits[target])
+
+    def _edges(self, cfg, end):
+        """
+        Returns the edges of every block, split at end, as lists of
+        (next block, best cycles, worst cycles).
+        """
+        edges = {}
+        for block in cfg.blocks.values():
+            start, cycles = block.start, 0
+            for addr in range(block.start, block.end):
+                if addr == end and addr != start:
+                    edges[start] = [(end, cycles, cycles)]
+                    start, cycles = end, 0
+                cycles = cycles + self._decode(addr).runner.cycles
+
+            last = self._decode(block.end - 1)
+            cls = last.runner.__class__
+            if cls is Break:
+                edges[start] = [(STOP, cycles, cycles)]
+                continue
+            taken = block.end + last.k if cls in (Brbs, Brbc) else None
+            edges[start] = []
+            for x in block.succs:
+                # The taken way of a branch takes a cycle more
+                extra = 1 if x == taken else 0
+                best = 0 if x == block.end else extra
+                edges[start].append((x, cycles + best, cycles + extra))
+        return edges
+
+    def _paths(self, edges, entry, nodes):
+        """
+        Returns the bounds of the paths from entry to every exit of a
+        region, as a dict of (best, worst) by exit. The exits are the
+        edges out of the nodes and the ones back to entry.
+        """
+        edges = dict((x, edges[x]) for x in nodes)
+        nodes = set(nodes)
+
+        # Collapse the loops, one at a time, into their first node
+        back = self._back_edges(edges, entry, nodes)
+        while back:
+            head = back[0][1]
+            body = set([head])
+            pending = [x for x, y in back if y == head]
+            while pending:
+                x = pending.pop()
+                if x not in body:
+                    body.add(x)
+                    pending.extend(y for y in nodes if y != head and
+                                   any(z[0] == x for z in edges[y]))
+            # The loop must be entered only by its first node
+            entries = [x for x in nodes - body if any(y[0] in body and
+                       y[0] != head for y in edges[x])]
+            if entries or (entry in body and entry != head):
+                raise AnalysisError("Irreducible loop at "
+                                    "0X{0:04X}".format(head))
+            if head not in self._loops:
+                raise AnalysisError("Loop at 0X{0:04X} without "
+                                    "bound".format(head))
+            low, high = self._loops[head]
+
+            inner = self._paths(edges, head, body)
+            best, worst = inner.pop(head)
+            for x in body:
+                del edges[x]
+            nodes = (nodes - body) | set([head])
+            edges[head] = [(x, (low - 1) * best + y[0],
+                            (high - 1) * worst + y[1])
+                           for x, y in inner.items()]
+            back = self._back_edges(edges, entry, nodes)
+
+        # Longest and shortest paths of what is left, with no cycles
+        bounds = {entry: (0, 0)}
+        exits = {}
+        for node in self._order(edges, entry, nodes):
+            if node not in bounds:
+                continue
+            best, worst = bounds[node]
+            for x, y, z in edges[node]:
+                found = exits if x == entry or x not in nodes else bounds
+                if x in found:
+                    found[x] = (min(found[x][0], best + y),
+                                max(found[x][1], worst + z))
+                else:
+                    found[x] = (best + y, worst + z)
+        return exits
+
+    def _back_edges(self, edges, entry, nodes):
+        """
+        Returns the edges (from, to) that close a cycle in a depth-first
+        search from entry, inside the nodes and not back to entry.
+        """
+        back = []
+        path = set([entry])
+        seen = set([entry])
+        stack = [(entry, iter(edges[entry]))]
+        while stack:
+            node, succs = stack[-1]
+            for x, best, worst in succs:
+                if x == entry or x not in nodes:
+                    continue
+                if x in path:
+                    back.append((node, x))
+                elif x not in seen:
+                    seen.add(x)
+                    path.add(x)
+                    stack.append((x, iter(edges[x])))
+                    break
+            else:
+                path.discard(node)
+                stack.pop()
+        return back
+
+    def _order(self, edges, entry, nodes):
+        """
+        Returns the nodes reachable from entry in topological order,
+        when there are no cycles.
+        """
+        order = []
+        seen = set([entry])
+        stack = [(entry, iter(edges[entry]))]
+        while stack:
+            node, succs = stack[-1]
+            for x, best, worst in succs:
+                if x != entry and x in nodes and x not in seen:
+                    seen.add(x)
+                    stack.append((x, iter(edges[x])))
+                    break
+            else:
+                order.append(node)
+                stack.pop()
+        order.reverse()
+        return order
+
+
+def measure(avrmcu, start=0, end=None, max_steps=None):
+    """
+    Runs the program of a simulator from an address, with the rest of
+    its state as it is, until PC reaches another one or until a BREAK,
+    and returns the cycles taken, to check them with the bounds.
+
+    :param avrmcu: Simulator with the program
+    :type avrmcu: object from AvrMcu
+    :param start: Address of the first instruction
+    :type start: int
+    :param end: Address where the region ends, a BREAK if None
+    :type end: int
+    :param max_steps: Maximum instructions to execute, no limit if
+        None
+    :type max_steps: int
+
+    :return: Cycles, or None if the run stops in another way
+    :rtype: int
+    """
+    from avrmcu import BREAK, BREAKPOINT
+
+    avrmcu._s.pc = Word(start)
+    result = avrmcu.run(max_steps, until_pc=end)
+    if result.reason == (BREAK if end is None else BREAKPOINT):
+        return result.cycles
+    return None
+
+
+if __name__ == '__main__':
+    from avrmcu import AvrMcu
+
+    parser = argparse.ArgumentParser(description='AVR worst-case cycles')
+    parser.add_argument('path',
+                        metavar='path',
+                        type=str,
+                        help='Path to the .hex file')
+    parser.add_argument('-s',
+                        type=lambda x: int(x, 0),
+                        default=0,
+                        help='Address of the first instruction')
+    parser.add_argument('-e',
+                        type=lambda x: int(x, 0),
+                        default=None,
+                        help='Address where the region ends, a BREAK if '
+                             'not given')
+    parser.add_argument('-l',
+                        type=str,
+                        action='append',
+                        default=[],
+                        help='Bound of a loop, as ADDR:MAX or '
+                             'ADDR:MIN:MAX')
+    parser.add_argument('--check',
+                        action='store_true',
+                        help='Run the region from reset and check the '
+                             'cycles')
+    parser.add_argument('-n',
+                        type=int,
+                        default=1000000,
+                        help='Maximum instructions of the run')
+    args = parser.parse_args()
+
+    loops = {}
+    for x in args.l:
+        x = [int(y, 0) for y in x.split(":")]
+        loops[x[0]] = x[1] if len(x) == 2 else (x[1], x[2])
+
+    avrmcu = AvrMcu()
+    avrmcu.load_hex(args.path)
+    bounds = WcetAnalyzer(avrmcu.decode).analyze(avrmcu._s, args.s, args.e,
+                                                 loops)
+    print "Bounds: {0}".format(bounds)
+    if args.check:
+        cycles = measure(avrmcu, args.s, args.e, args.n)
+        if cycles is None:
+            print "Measured: the run did not reach the end"
+        else:
+            print "Measured: {0} cycles, {1}".format(cycles, "inside" if
+                  bounds.contains(cycles) else "OUT OF BOUNDS")